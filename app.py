@@ -1,13 +1,63 @@
 from __future__ import annotations
-from flask import Flask, send_from_directory, jsonify, request, abort, safe_join
+from flask import Flask, jsonify, request, abort, safe_join, Response
 from pathlib import Path
-from datetime import timedelta
-import smtplib, json, os
+from datetime import datetime, timedelta, timezone
+from collections import OrderedDict
+import json, os, gzip, stat, hashlib, hmac, mimetypes, threading, atexit, time, fnmatch
 import urllib.parse
-from email.message import EmailMessage
+from werkzeug.http import http_date, parse_accept_header, parse_etags, quote_etag
+from werkzeug.utils import get_content_type
+from werkzeug.wsgi import wrap_file
+import lead_export
+from http_ranges import STREAM_CHUNK, byte_ranges, file_chunks, file_plan
+from lead_journal import LeadJournal
+from lead_notifier import LeadNotifier
+from lead_store import LeadDeduper, LeadStore
+from instrumentation import instrument_flask, metrics, span
+
+try:
+    import brotli  # type: ignore
+except ImportError:  # Why: optional, gzip still covers every client
+    brotli = None
 
 BASE = Path(__file__).parent.resolve()
-app = Flask(__name__, static_url_path="", static_folder=str(BASE))
+# Why: no built-in static route, so every file goes through static_proxy and the asset cache
+app = Flask(__name__, static_folder=None)
+instrument_flask(app)
+
+# Static asset cache tuning (bytes)
+ASSET_CACHE_ENABLED = os.getenv("ASSET_CACHE", "1") != "0"
+ASSET_CACHE_MAX_BYTES = int(os.getenv("ASSET_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+ASSET_CACHE_MAX_FILE = int(os.getenv("ASSET_CACHE_MAX_FILE", str(512 * 1024)))
+ASSET_WARM_DIRS = ("assets", "css", "js")
+ASSET_WARM_GLOBS = ("index.html", "*.css", "*.min.js")
+ASSET_MANIFEST = BASE / "asset-manifest.json"
+IMMUTABLE_MAX_AGE = 31536000
+PRIVATE_PATHS = ("/api/leads",)
+CACHEABLE_STATUSES = (200, 206, 304)
+# data/ files holding lead history (journal, rotated/compacted segments, temp parts, leads.json)
+LEAD_FILES = ("leads.json", "leads.jsonl*", "leads-*")
+# Servable files: allowlisted directories (recursive) plus selected root-level files
+STATIC_DIRS = tuple(d for d in os.getenv("STATIC_DIRS", "assets,css,js,public,blog,projects,static,styles,ui").split(",") if d)
+STATIC_EXTS = frozenset({".html", ".css", ".js", ".mjs", ".map", ".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp",
+                         ".avif", ".ico", ".woff", ".woff2", ".ttf", ".pdf", ".mp4", ".webm", ".webmanifest",
+                         ".xml", ".json", ".txt"})
+# Repo root: only these names/globs are served (pages, the bundles tools/fingerprint_assets.py
+# fingerprints, icons and crawler files); server code, configs and tooling at the root never are
+ROOT_FILES = ("*.html", "*.css", "app*.js", "sfs-*.js", "favicon.*", "safari-pinned-tab.svg", "static-logo.png",
+              "site.webmanifest", "browserconfig.xml", "robots.txt", "sitemap.xml", "rss.xml",
+              "site.config.json", "pricing.json", "asset-manifest.json")
+STATIC_INDEX_REFRESH = float(os.getenv("STATIC_INDEX_REFRESH", "0"))
+DOC_CACHE_CHECK_INTERVAL = float(os.getenv("DOC_CACHE_CHECK_INTERVAL", "1.0"))
+SITE_CONFIG = BASE / "site.config.json"
+# Large-file path: "x-sendfile" (Apache/lighttpd) or "x-accel" (nginx) hands the transfer to the proxy
+SENDFILE = os.getenv("SENDFILE", "").lower()
+X_ACCEL_PREFIX = "/" + os.getenv("X_ACCEL_PREFIX", "/_site/").strip("/") + "/"
+# Width-stepped WebP/AVIF copies of raster assets, written by tools/smartflo_brand_pack.py --variants
+IMAGE_VARIANTS = "assets/variants/variants.json"
+VARIANT_TYPES = (("image/avif", "avif"), ("image/webp", "webp"))
+VARIANT_VARY = ("Accept", "Sec-CH-Width", "Width")
+COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml", "application/xml")
 
 def load_json(path: Path, fallback=None):
     try:
@@ -18,14 +68,419 @@ def load_json(path: Path, fallback=None):
     except (FileNotFoundError, json.JSONDecodeError, OSError):
         return fallback
 
+class AssetCache:
+    """In-memory static files: bytes, content-hash ETags and gzip/brotli variants.
+
+    Entries are kept in LRU order and evicted once the total size (all variants
+    included) passes ``max_bytes``. Files over ``max_file`` are never cached and
+    fall through to ``serve_file``; that verdict is remembered too. Like
+    :class:`JsonDocCache`, an entry is re-stat'ed at most once per
+    ``check_interval`` seconds and reloaded when its (mtime, size, inode) changes.
+    """
+
+    def __init__(self, root: Path, max_bytes: int, max_file: int, check_interval: float = 1.0):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_file = max_file
+        self.check_interval = check_interval
+        self.size = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._oversize: dict = {}  # rel -> monotonic time it was found too big
+        self._lock = threading.Lock()
+
+    def warm(self, dirs=ASSET_WARM_DIRS, globs=ASSET_WARM_GLOBS) -> None:
+        for d in dirs:
+            for p in sorted((self.root / d).rglob("*")):
+                if p.is_file():
+                    self.get(p.relative_to(self.root).as_posix())
+        for pattern in globs:
+            for p in sorted(self.root.glob(pattern)):
+                if p.is_file():
+                    self.get(p.name)
+
+    def cached(self, rel: str):
+        """The in-memory entry for ``rel`` if it needs no stat; never touches the filesystem."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(rel)
+            if entry is not None and now - entry["checked"] < self.check_interval:
+                self._entries.move_to_end(rel)
+                self.stats["hits"] += 1
+                return entry
+            return None
+
+    def get(self, rel: str):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._oversize.get(rel, -self.check_interval) < self.check_interval:
+                return None  # Why: known too big; serve_file takes it without a second stat here
+            entry = self._entries.get(rel)
+        if entry is not None:
+            if now - entry["checked"] >= self.check_interval:
+                entry = self._revalidate(rel, entry, now)
+            if entry is not None:
+                with self._lock:
+                    if rel in self._entries:
+                        self._entries.move_to_end(rel)
+                    self.stats["hits"] += 1
+                return entry
+        with self._lock:
+            self.stats["misses"] += 1
+        with span("static_read"):
+            entry = self._load(rel)
+        if entry is None:
+            return None
+        with self._lock:
+            self._oversize.pop(rel, None)
+            old = self._entries.pop(rel, None)
+            if old is not None:
+                self.size -= old["size"]
+            self._entries[rel] = entry
+            self.size += entry["size"]
+            while self.size > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= evicted["size"]
+                self.stats["evictions"] += 1
+        return entry
+
+    def _revalidate(self, rel: str, entry: dict, now: float):
+        """``entry`` re-stamped if the file is unchanged on disk; None (and dropped) if not."""
+        try:
+            st = os.stat(self.root / rel)
+            sig = (st.st_mtime_ns, st.st_size, st.st_ino)
+        except OSError:
+            sig = None
+        with self._lock:
+            if sig != entry["sig"]:
+                if self._entries.get(rel) is entry:
+                    del self._entries[rel]
+                    self.size -= entry["size"]
+                return None
+            # Why: replace, don't mutate, so readers on other threads never see a half-built entry
+            entry = {**entry, "checked": now}
+            if rel in self._entries:
+                self._entries[rel] = entry
+            return entry
+
+    def _load(self, rel: str):
+        path = self.root / rel
+        try:
+            st = os.stat(path)
+            if not stat.S_ISREG(st.st_mode):
+                return None
+            if st.st_size > self.max_file:
+                with self._lock:
+                    self._oversize[rel] = time.monotonic()
+                return None
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        mimetype = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        digest = hashlib.blake2b(data, digest_size=10).hexdigest()
+        variants = {"identity": (data, digest)}
+        if mimetype.startswith(COMPRESSIBLE) and len(data) > 1024:
+            gz = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(gz) < len(data):
+                variants["gzip"] = (gz, digest + "-gz")
+            if brotli is not None:
+                br = brotli.compress(data, quality=11)
+                if len(br) < len(data):
+                    variants["br"] = (br, digest + "-br")
+        return {
+            "sig": (st.st_mtime_ns, st.st_size, st.st_ino),
+            "checked": time.monotonic(),
+            "mimetype": mimetype,
+            "variants": variants,
+            "etags": {etag for _, etag in variants.values()},
+            "size": sum(len(body) for body, _ in variants.values()),
+        }
+
+    def negotiate(self, entry: dict, accept_encoding: str, if_none_match: str):
+        """(status, headers, body) for a cached entry; shared by the Flask and ASGI front ends."""
+        variants = entry["variants"]
+        offered = [e for e in ("br", "gzip") if e in variants]
+        encoding = (parse_accept_header(accept_encoding).best_match(offered) if offered else None) or "identity"
+        body, etag = variants[encoding]
+        headers = {"Content-Type": get_content_type(entry["mimetype"], "utf-8"), "ETag": quote_etag(etag),
+                   "Accept-Ranges": "bytes"}
+        if len(variants) > 1:
+            headers["Vary"] = "Accept-Encoding"
+        wanted = parse_etags(if_none_match)
+        if any(tag in wanted for tag in entry["etags"]):
+            return 304, headers, b""
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return 200, headers, body
+
+    def respond(self, rel: str):
+        """Build a response for ``rel`` from memory, or None if it isn't cacheable."""
+        entry = self.get(rel)
+        if entry is None:
+            return None
+        return make_response(*self.negotiate(entry, request.headers.get("Accept-Encoding", ""),
+                                              request.headers.get("If-None-Match", "")))
+
+class JsonDocCache:
+    """JSON files kept parsed and pre-serialized, re-read only when they change on disk.
+
+    A file is re-stat'ed at most once per ``check_interval`` seconds and
+    re-read only when its (mtime, size, inode) changes. Each entry carries the
+    raw bytes to send and a content-hash ETag.
+    """
+
+    def __init__(self, check_interval: float = 1.0):
+        self.check_interval = check_interval
+        self.stats = {"hits": 0, "revalidated": 0, "reloads": 0}
+        self._docs: dict = {}
+
+    def get(self, path: Path):
+        now = time.monotonic()
+        entry = self._docs.get(path)
+        if entry is not None and now - entry["checked"] < self.check_interval:
+            self.stats["hits"] += 1
+            return entry
+        try:
+            st = os.stat(path)
+        except OSError:
+            self._docs.pop(path, None)
+            return None
+        sig = (st.st_mtime_ns, st.st_size, st.st_ino)
+        if entry is None or entry["sig"] != sig:
+            self.stats["reloads"] += 1
+            try:
+                body = path.read_bytes()
+            except OSError:
+                return None
+            try:
+                obj = json.loads(body)
+            except ValueError:
+                obj = None
+            entry = {"sig": sig, "obj": obj, "body": body,
+                     "etag": hashlib.blake2b(body, digest_size=10).hexdigest()}
+        else:
+            self.stats["revalidated"] += 1
+        # Why: replace, don't mutate, so readers on other threads never see a half-built entry
+        self._docs[path] = {**entry, "checked": now}
+        return self._docs[path]
+
+    def load(self, path: Path, fallback=None):
+        entry = self.get(path)
+        return fallback if entry is None or entry["obj"] is None else entry["obj"]
+
+    def respond(self, path: Path):
+        """Response for a JSON file (304 on a matching If-None-Match), or None if it's missing."""
+        entry = self.get(path)
+        if entry is None:
+            return None
+        return make_response(*conditional(entry["body"], entry["etag"], "application/json",
+                                          request.headers.get("If-None-Match", "")))
+
+def conditional(body: bytes, etag: str, mimetype: str, if_none_match: str):
+    """(status, headers, body) honoring If-None-Match for a revalidate-always document."""
+    # Why: always revalidate; the 304 is the cheap path
+    headers = {"Content-Type": mimetype, "ETag": quote_etag(etag), "Cache-Control": "no-cache"}
+    if etag in parse_etags(if_none_match):
+        return 304, headers, b""
+    return 200, headers, body
+
+def make_response(status: int, headers: dict, body: bytes):
+    return Response(body, status=status, headers=headers)
+
+def serve_file(path: Path):
+    """Large/uncached files: conditional GET, Range/If-Range, proxy offload, sendfile or chunked pread."""
+    try:
+        st = path.stat()
+    except OSError:
+        abort(404)
+    if not path.is_file():
+        abort(404)
+    mimetype = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    etag = f"{st.st_mtime_ns:x}-{st.st_size:x}"
+    headers = {"Content-Type": get_content_type(mimetype, "utf-8"), "ETag": quote_etag(etag),
+               "Last-Modified": http_date(st.st_mtime), "Accept-Ranges": "bytes"}
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        return Response(status=304, headers=headers)
+    if SENDFILE == "x-accel":
+        # Why: nginx streams the file (ranges included) and the worker is free immediately
+        headers["X-Accel-Redirect"] = urllib.parse.quote(X_ACCEL_PREFIX + path.relative_to(BASE).as_posix())
+        return Response(status=200, headers=headers)
+    if SENDFILE == "x-sendfile":
+        headers["X-Sendfile"] = str(path)
+        return Response(status=200, headers=headers)
+    ranges = byte_ranges(request.headers.get("Range", ""), request.headers.get("If-Range", ""), etag,
+                         st.st_mtime, st.st_size)
+    status, extra, pieces = file_plan(st, get_content_type(mimetype, "utf-8"), ranges)
+    headers.update(extra)
+    if request.method == "HEAD" or not pieces:
+        return Response(status=status, headers=headers)
+    f = open(path, "rb")
+    if ranges is None and "wsgi.file_wrapper" in request.environ:
+        # Why: gunicorn/uWSGI turn a file_wrapper into os.sendfile, so bytes never enter Python
+        body = wrap_file(request.environ, f, STREAM_CHUNK)
+    else:
+        body = file_chunks(f, pieces)
+    resp = Response(body, status=status, headers=headers, direct_passthrough=True)
+    resp.call_on_close(f.close)  # Why: a client that disconnects early never starts the generator
+    return resp
+
+def cache_policy(path: str, status: int, mimetype: str, no_cache: bool = False) -> str:
+    # Why: HTML fresh, assets cached, fingerprinted assets cached forever
+    if path.startswith(PRIVATE_PATHS):
+        return "private, no-store"  # Security: admin lead data must never sit in a shared cache
+    if status not in CACHEABLE_STATUSES:
+        return "no-store"  # Why: a cached 404/416/4xx outlives the fix, e.g. a file added after startup
+    if path.lstrip("/") in fingerprinted:
+        return f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    if mimetype == "text/html" or no_cache:
+        return "no-cache"
+    return f"public, max-age={int(timedelta(days=7).total_seconds())}"
+
+docs = JsonDocCache(DOC_CACHE_CHECK_INTERVAL)
+_health_body = ("", b"", "")  # (config etag, body, etag)
+
+class RouteIndex:
+    """Every servable path, relative and posix-style, walked once from the allowlist.
+
+    static_proxy answers a path that isn't in the set with a 404 before any
+    filesystem call, so scanner traffic costs one set lookup. With
+    ``STATIC_INDEX_REFRESH`` > 0 a daemon thread re-walks the allowlist on that
+    interval and swaps in the new set.
+    """
+
+    def __init__(self, root: Path, dirs=STATIC_DIRS, exts=STATIC_EXTS, root_files=ROOT_FILES):
+        self.root = root
+        self.dirs = dirs
+        self.exts = exts
+        self.root_files = root_files
+        self.paths: frozenset = self.build()
+
+    def __contains__(self, rel: str) -> bool:
+        return rel in self.paths
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def build(self) -> frozenset:
+        found = set()
+        for entry in os.scandir(self.root):
+            name = entry.name
+            ext = os.path.splitext(name)[1].lower()
+            if name.startswith(".") or not entry.is_file():
+                continue
+            if ext in self.exts and any(fnmatch.fnmatchcase(name, p) for p in self.root_files):
+                found.add(name)
+        for d in self.dirs:
+            top = self.root / d
+            for dirpath, dirnames, filenames in os.walk(top):
+                dirnames[:] = [n for n in dirnames if not n.startswith(".") and n != "node_modules"]
+                rel_dir = Path(dirpath).relative_to(self.root).as_posix()
+                for name in filenames:
+                    if not name.startswith(".") and os.path.splitext(name)[1].lower() in self.exts:
+                        found.add(f"{rel_dir}/{name}")
+        return frozenset(found)
+
+    def refresh(self) -> None:
+        self.paths = self.build()
+
+    def watch(self, interval: float) -> None:
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.refresh()
+                except OSError:
+                    pass  # Why: keep serving the last good index
+        threading.Thread(target=loop, name="route-index", daemon=True).start()
+
+routes = RouteIndex(BASE)
+if STATIC_INDEX_REFRESH > 0:
+    routes.watch(STATIC_INDEX_REFRESH)
+
+asset_cache = AssetCache(BASE, ASSET_CACHE_MAX_BYTES, ASSET_CACHE_MAX_FILE, DOC_CACHE_CHECK_INTERVAL)
+if ASSET_CACHE_ENABLED:
+    asset_cache.warm()
+
+# Logical asset path -> fingerprinted copy, written by tools/fingerprint_assets.py
+asset_manifest: dict = load_json(ASSET_MANIFEST, {}) or {}
+fingerprinted = frozenset(asset_manifest.values())
+asset_sources = {fp: logical for logical, fp in asset_manifest.items()}
+
+def asset_url(name: str) -> str:
+    """Public URL for a logical asset, fingerprinted when the manifest knows it."""
+    name = name.lstrip("/")
+    return "/" + asset_manifest.get(name, name)
+
+app.jinja_env.globals["asset_url"] = asset_url
+
+def pick_variant(rel: str, accept: str, width_hint: str) -> tuple:
+    """(path to serve, negotiated?) for ``rel``: the best pre-rendered variant the client can decode.
+
+    The format is the first of AVIF/WebP the ``Accept`` header names; the width
+    is the smallest variant at least ``width_hint`` pixels wide, else the
+    largest. Negotiated responses must carry ``Vary: VARIANT_VARY``.
+    """
+    # Why: no manifest in the route index means no variants, so ordinary requests skip the stat
+    if IMAGE_VARIANTS not in routes or not rel.lower().endswith((".png", ".jpg", ".jpeg")):
+        return rel, False
+    manifest = docs.load(BASE / IMAGE_VARIANTS, {})
+    entry = manifest.get(asset_sources.get(rel, rel)) if isinstance(manifest, dict) else None
+    if not entry:
+        return rel, False
+    # Why: only types named outright; "*/*" alone doesn't mean the client decodes AVIF
+    named = {value for value, q in parse_accept_header(accept) if q > 0}
+    fmt = next((f for mime, f in VARIANT_TYPES if mime in named), None)
+    choices = sorted((v for v in entry.get("variants", ()) if v.get("format") == fmt and v.get("path") in routes),
+                     key=lambda v: v["width"])
+    if not choices:
+        metrics.inc("image_variant_total", format="original")
+        return rel, True
+    try:
+        want = int(width_hint or 0)
+    except ValueError:
+        want = 0
+    pick = next((v for v in choices if v["width"] >= want), choices[-1]) if want > 0 else choices[-1]
+    metrics.inc("image_variant_total", format=fmt)
+    return pick["path"], True
+
+# Why: one group-committing writer instead of an open/write/close per request
+journal = LeadJournal.from_env(BASE / "data")
+atexit.register(journal.close)
+lead_store = LeadStore(BASE / "data")
+atexit.register(lead_store.save)
+deduper = LeadDeduper.from_env(lead_store)
+
+# Why: SMTP runs on a background worker so /lead never waits on the mail relay
+notifier = LeadNotifier.from_env()
+if notifier is not None:
+    notifier.start()
+    atexit.register(notifier.stop)
+
+def collect_metrics():
+    """Counters the subsystems keep themselves, read only when /metrics is scraped."""
+    for result, n in asset_cache.stats.items():
+        yield "asset_cache_total", "counter", {"result": result}, n
+    yield "asset_cache_bytes", "gauge", {}, asset_cache.size
+    for result, n in docs.stats.items():
+        yield "doc_cache_total", "counter", {"result": result}, n
+    yield "static_routes", "gauge", {}, len(routes)
+    for name, n in journal.stats.items():
+        yield f"lead_journal_{name}_total", "counter", {}, n
+    for result, n in deduper.stats.items():
+        yield "lead_dedupe_total", "counter", {"result": result}, n
+    if notifier is not None:
+        for name, value in notifier.metrics().items():
+            if isinstance(value, (int, float)):
+                kind = "gauge" if name.startswith("queue_") or name == "connected" else "counter"
+                yield f"lead_notifier_{name}" + ("_total" if kind == "counter" else ""), kind, {}, value
+
+metrics.collect(collect_metrics)
+
 @app.after_request
 def add_caching(resp):
-    # Why: HTML fresh, assets cached
-    if resp.mimetype == "text/html":
-        resp.cache_control.no_cache = True
-    else:
-        resp.cache_control.public = True
-        resp.cache_control.max_age = int(timedelta(days=7).total_seconds())
+    resp.headers["Cache-Control"] = cache_policy(request.path, resp.status_code, resp.mimetype,
+                                                 bool(resp.cache_control.no_cache))
 
     # Security: Configure CORS with allowed origins from environment
     allowed_origin = os.getenv("CORS_ORIGIN", "http://localhost:3000")
@@ -34,87 +489,190 @@ def add_caching(resp):
 
 @app.route("/")
 def index():
-    return send_from_directory(BASE, "index.html")
+    if "index.html" not in routes:
+        abort(404)
+    resp = asset_cache.respond("index.html") if ASSET_CACHE_ENABLED else None
+    return resp or serve_file(BASE / "index.html")
+
+def health_doc():
+    """(body, etag) for /health, serialized once per site.config.json version."""
+    global _health_body
+    cfg = docs.get(SITE_CONFIG)
+    site_name = (cfg["obj"] or {}).get("siteName", "SmartFlow Systems") if cfg else "SmartFlow Systems"
+    # Security: /health is unauthenticated; notifier state (last_error included) is on /metrics only
+    # Why: body only changes with site.config.json, so serialize it once per config version
+    version = cfg["etag"] if cfg else "-"
+    if _health_body[0] != version:
+        body = json.dumps({"ok": True, "site": site_name}).encode()
+        _health_body = (version, body, hashlib.blake2b(body, digest_size=10).hexdigest())
+    return _health_body[1], _health_body[2]
 
 @app.get("/health")
 def health():
-    cfg = load_json(BASE / "site.config.json", {})
-    site_name = cfg.get("siteName", "SmartFlow Systems") if cfg else "SmartFlow Systems"
-    return jsonify({"ok": True, "site": site_name})
+    body, etag = health_doc()
+    return make_response(*conditional(body, etag, "application/json", request.headers.get("If-None-Match", "")))
+
+def private_data(fname: str) -> bool:
+    """True for files under data/ that are never published: dotfile state and the lead history."""
+    parts = fname.replace("\\", "/").split("/")
+    # Security: leads live behind check_admin on /api/leads; the journal, its segments,
+    # compacted output and leads.json must not be readable around that gate
+    return any(part.startswith(".") for part in parts) or any(fnmatch.fnmatch(parts[-1], g) for g in LEAD_FILES)
 
 @app.route("/data/<path:fname>")
 def data_files(fname: str):
+    if private_data(fname):
+        abort(404)
     # Security: prevent path traversal using Flask's safe_join
     # safe_join returns None if the path tries to escape the directory
     safe_path = safe_join(str(BASE / "data"), fname)
     if safe_path is None:
         abort(403)
 
-    # Check if file exists
-    if not Path(safe_path).is_file():
-        abort(404)
+    # JSON documents are answered from memory
+    if safe_path.endswith(".json"):
+        resp = docs.respond(Path(safe_path))
+        if resp is None:
+            abort(404)
+        return resp
 
-    return send_from_directory(BASE / "data", fname)
+    return serve_file(Path(safe_path))
 
-@app.post("/lead")
-def lead():
-    """Receive lead as JSON, store to /data/leads.jsonl, optionally email."""
-    payload = request.get_json(silent=True) or {}
+def utc_stamp() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+def prepare_lead(payload: dict):
+    """Validate and dedupe a lead: (record to store or None, status, body)."""
     name = str(payload.get("name", "")).strip()
     email = str(payload.get("email", "")).strip()
     if not name or "@" not in email:  # minimal validation
-        return jsonify({"ok": False, "error": "invalid"}), 400
-    payload["ts"] = payload.get("ts") or __import__("datetime").datetime.utcnow().isoformat() + "Z"
-
-    # Ensure data directory exists
-    data_dir = BASE / "data"
-    data_dir.mkdir(exist_ok=True)
-    
-    # Store
-    out = data_dir / "leads.jsonl"
-    with out.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(payload, ensure_ascii=False) + "\n")
-
-    # Optional email
-    host = os.getenv("SMTP_HOST", "")
-    to_addr = os.getenv("SMTP_TO", "")
-    if host and to_addr:
-        try:
-            msg = EmailMessage()
-            msg["Subject"] = f"New Lead: {name} ({payload.get('plan') or 'undecided'})"
-            msg["From"] = os.getenv("SMTP_FROM", to_addr)
-            msg["To"] = to_addr
-            body = "\n".join([f"{k}: {payload.get(k,'')}" for k in ("name","email","business","plan","goal","page","ts")])
-            msg.set_content(body)
-            port = int(os.getenv("SMTP_PORT", "587"))
-            user = os.getenv("SMTP_USER", "")
-            pwd = os.getenv("SMTP_PASS", "")
-            with smtplib.SMTP(host, port, timeout=10) as s:
-                s.starttls()
-                if user and pwd: s.login(user, pwd)
-                s.send_message(msg)
-        except Exception:
-            pass  # Why: never block user on email issues
-
-    return jsonify({"ok": True})
+        return None, 400, {"ok": False, "error": "invalid"}
+    # Why: ts orders /api/leads and drives dedupe, so it is always the server's clock
+    client_ts = payload.pop("ts", None)
+    if client_ts:
+        payload["client_ts"] = str(client_ts)[:64]
+    payload["ts"] = utc_stamp()
+
+    # Why: double-submits and bot retries get a cheap ack, no write and no email
+    if not deduper.claim(email):
+        return None, 200, {"ok": True, "duplicate": True, "message": "already received"}
+    return payload, 200, {"ok": True}
+
+def lead_failed(record: dict):
+    deduper.release(str(record.get("email", "")))
+    return 503, {"ok": False, "error": "unavailable"}
+
+def lead_stored(record: dict) -> None:
+    # Optional email, sent by the background notifier
+    if notifier is not None:
+        notifier.submit(record)
+
+@app.post("/lead")
+def lead():
+    """Receive lead as JSON, store to /data/leads.jsonl, optionally email."""
+    with span("lead_parse"):
+        payload = request.get_json(silent=True) or {}
+    with span("lead_dedupe"):
+        record, status, body = prepare_lead(payload)
+    if record is None:
+        return jsonify(body), status
+
+    # Store; returns once the record is fsynced
+    try:
+        with span("lead_persist"):
+            journal.append(record)
+    except (OSError, TimeoutError):
+        status, body = lead_failed(record)
+        return jsonify(body), status
+
+    lead_stored(record)
+    return jsonify(body), status
+
+def check_admin(header: str):
+    """Same contract as requireAuth in server.js: Bearer ADMIN_API_KEY (or SYNC_TOKEN).
+
+    Returns None when allowed, else (status, body).
+    """
+    api_key = os.getenv("ADMIN_API_KEY") or os.getenv("SYNC_TOKEN")
+    if not api_key:
+        return 500, {"ok": False, "error": "admin api key not configured"}
+    if not header:
+        return 401, {"ok": False, "error": "authentication required"}
+    token = header[7:] if header.startswith("Bearer ") else header
+    if not hmac.compare_digest(token.encode(), api_key.encode()):
+        return 403, {"ok": False, "error": "invalid credentials"}
+    return None
+
+def query_leads(args) -> tuple:
+    """(status, body) for a lead query given a mapping of query args."""
+    try:
+        limit = max(1, min(int(args.get("limit", 50)), 500))
+        page = lead_store.query(
+            filters={f: args.get(f) for f in ("email", "plan", "source", "status")},
+            since=args.get("since", ""), until=args.get("until", ""),
+            cursor=args.get("cursor") or None, limit=limit,
+        )
+    except ValueError:
+        return 400, {"ok": False, "error": "bad query"}
+    return 200, {"ok": True, "count": len(page["leads"]), **page}
+
+@app.get("/api/leads")
+def api_leads():
+    """Paginated lead query: ?email=&plan=&source=&status=&since=&until=&limit=&cursor="""
+    denied = check_admin(request.headers.get("Authorization", ""))
+    if denied:
+        return jsonify(denied[1]), denied[0]
+    status, body = query_leads(request.args)
+    return jsonify(body), status
+
+def export_leads(args) -> tuple:
+    """(status, headers, body) for a lead export; body is a chunk iterator on 200, else an error dict."""
+    fmt = args.get("format", "csv")
+    if fmt not in lead_export.FORMATS:
+        return 400, {}, {"ok": False, "error": "format must be csv or columns"}
+    content_type, ext = lead_export.FORMATS[fmt]
+    chunks = lead_export.export(BASE / "data", fmt, since=args.get("since", ""), until=args.get("until", ""),
+                                plan=args.get("plan", ""))
+    return 200, {"Content-Type": content_type, "Content-Disposition": f'attachment; filename="leads.{ext}"',
+                 "Cache-Control": "private, no-store"}, chunks
+
+@app.get("/api/leads/export")
+def api_leads_export():
+    """Streamed lead history: ?format=csv|columns&since=&until=&plan="""
+    denied = check_admin(request.headers.get("Authorization", ""))
+    if denied:
+        return jsonify(denied[1]), denied[0]
+    status, headers, body = export_leads(request.args)
+    if status != 200:
+        return jsonify(body), status
+    # Why: read straight from the files, not LeadStore, so memory stays flat
+    return Response(body, headers=headers)
 
 @app.route("/<path:path>")
 def static_proxy(path: str):
     # Decode percent-encoded characters to prevent traversal via encoded payloads
     decoded_path = urllib.parse.unquote(path)
 
-    # Security: prevent path traversal using Flask's safe_join
-    # safe_join returns None if the path tries to escape the directory
-    safe_path = safe_join(str(BASE), decoded_path)
-    if safe_path is None:
-        abort(403)
-
-    try:
-        return send_from_directory(BASE, decoded_path)
-    except Exception:
-        # If file not found, return 404
+    # Security: only paths in the startup-built index are servable; that covers
+    # traversal and keeps misses off the filesystem entirely
+    if decoded_path not in routes:
         abort(404)
 
+    headers = request.headers
+    rel, negotiated = pick_variant(decoded_path, headers.get("Accept", ""),
+                                   request.args.get("w") or headers.get("Sec-CH-Width") or headers.get("Width", ""))
+
+    # Why: ranges are served from disk, where they map straight onto the file
+    resp = None
+    if ASSET_CACHE_ENABLED and "Range" not in headers:
+        resp = asset_cache.respond(rel)
+    if resp is None:
+        with span("static_send"):
+            resp = serve_file(BASE / rel)
+    if negotiated:
+        resp.vary.update(VARIANT_VARY)
+    return resp
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", "5000"))
     app.run(host="0.0.0.0", port=port, debug=False)
\ No newline at end of file
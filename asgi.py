@@ -0,0 +1,342 @@
+"""ASGI front end for the site server.
+
+Serves the same routes as app.py (``/``, ``/health``, ``/data/<file>``,
+``/lead``, ``/api/leads``, static files) plus server.py's ``/api/gh-sync``,
+sharing app.py's caches, journal and notifier and server.py's sync queue
+rather than wrapping Flask.
+Nothing blocks the event loop: cold files are read in 64 KiB chunks on the
+executor (or handed to the server's zero-copy send, with Range support shared
+with app.py) and ``/lead`` awaits the journal's group commit.
+
+On lifespan shutdown new leads get a 503, in-flight lead writes are awaited
+(up to ``ASGI_SHUTDOWN_TIMEOUT``), then the journal, notifier and sync queue
+are closed.
+
+Run with ``python asgi.py`` (uvicorn, sized by ``ASGI_WORKERS`` and
+``ASGI_CONCURRENCY``) or any ASGI server: ``uvicorn asgi:application``.
+"""
+import asyncio, json, mimetypes, os, time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from pathlib import Path
+from urllib.parse import parse_qsl, quote, unquote
+
+import app as site
+import server as sync
+from lead_journal import JournalClosed
+from instrumentation import metrics, metrics_auth_ok, SIZE_BUCKETS
+
+CHUNK = 64 * 1024
+MAX_BODY = 1024 * 1024
+ASGI_WORKERS = int(os.getenv("ASGI_WORKERS", "1"))
+ASGI_CONCURRENCY = int(os.getenv("ASGI_CONCURRENCY", "0")) or None
+ASGI_IO_THREADS = int(os.getenv("ASGI_IO_THREADS", "32"))
+ASGI_SHUTDOWN_TIMEOUT = float(os.getenv("ASGI_SHUTDOWN_TIMEOUT", "15"))
+
+class HTTPError(Exception):
+    def __init__(self, status: int):
+        self.status = status
+
+class Request:
+    __slots__ = ("scope", "receive", "method", "path", "headers", "route")
+
+    def __init__(self, scope, receive):
+        self.scope = scope
+        self.receive = receive
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+        self.route = "<unmatched>"
+
+    def header(self, name: str) -> str:
+        return self.headers.get(name, "")
+
+    @property
+    def args(self) -> dict:
+        return dict(parse_qsl(self.scope.get("query_string", b"").decode("latin-1")))
+
+    async def body(self) -> bytes:
+        chunks, size = [], 0
+        while True:
+            message = await self.receive()
+            if message["type"] == "http.disconnect":
+                raise HTTPError(400)
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > MAX_BODY:
+                raise HTTPError(413)
+            chunks.append(chunk)
+            if not message.get("more_body"):
+                return b"".join(chunks)
+
+    async def json(self) -> dict:
+        try:
+            payload = json.loads(await self.body() or b"{}")
+        except ValueError:
+            return {}
+        return payload if isinstance(payload, dict) else {}
+
+class Server:
+    def __init__(self):
+        self.inflight: set = set()
+        self.draining = False
+        self.executor = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        if scope["type"] != "http":
+            return
+        req = Request(scope, receive)
+        t0 = time.perf_counter()
+        sent = {"status": 500, "bytes": 0}
+
+        async def tracked(message):
+            if message["type"] == "http.response.start":
+                sent["status"] = message["status"]
+            else:
+                sent["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        metrics.gauge("http_in_flight", 1)
+        try:
+            await self.dispatch(req, tracked)
+        except HTTPError as e:
+            # Why: same as Flask's error pages; a CDN must not hold a 404 for a file added after startup
+            await self.send(req, tracked, e.status, {"Content-Type": "text/plain; charset=utf-8",
+                                                     "Cache-Control": "no-store"}, f"{e.status}\n".encode())
+        finally:
+            metrics.gauge("http_in_flight", -1)
+            metrics.observe("http_request_seconds", time.perf_counter() - t0, route=req.route,
+                            method=req.method, status=f"{sent['status'] // 100}xx")
+            metrics.observe("http_response_bytes", sent["bytes"], SIZE_BUCKETS, route=req.route)
+
+    # -- lifecycle -----------------------------------------------------------
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self.executor = ThreadPoolExecutor(ASGI_IO_THREADS, thread_name_prefix="asgi-io")
+                asyncio.get_running_loop().set_default_executor(self.executor)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.drain()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def drain(self):
+        self.draining = True
+        if self.inflight:
+            await asyncio.wait(set(self.inflight), timeout=ASGI_SHUTDOWN_TIMEOUT)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, site.journal.close)
+        if site.notifier is not None:
+            await loop.run_in_executor(None, site.notifier.stop)
+        await loop.run_in_executor(None, site.lead_store.save)
+        await loop.run_in_executor(None, sync.sync_queue.stop)
+
+    # -- routing -------------------------------------------------------------
+
+    async def dispatch(self, req: Request, send):
+        path, method = req.path, req.method
+        if path in ("/lead", "/api/gh-sync", "/health", "/api/leads", "/api/leads/export", "/metrics", "/"):
+            req.route = path
+        elif path.startswith("/data/"):
+            req.route = "/data/<path:fname>"
+        else:
+            req.route = "/<path:path>"
+        if path == "/lead":
+            if method != "POST":
+                raise HTTPError(405)
+            return await self.lead(req, send)
+        if path == "/api/gh-sync":
+            if method != "POST":
+                raise HTTPError(405)
+            payload = await req.json()
+            return await self.send_json(req, send, *sync.accept_sync(payload, req.header("x-github-delivery"),
+                                                                     req.header("x-github-event")))
+        if method not in ("GET", "HEAD"):
+            raise HTTPError(405)
+        if path == "/metrics":
+            if not metrics_auth_ok(req.header("authorization")):
+                raise HTTPError(403)
+            return await self.send(req, send, 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8",
+                                                    "Cache-Control": "no-cache"}, metrics.render().encode())
+        if path == "/health":
+            body, etag = site.health_doc()
+            return await self.send(req, send, *site.conditional(body, etag, "application/json",
+                                                               req.header("if-none-match")))
+        if path == "/api/leads":
+            denied = site.check_admin(req.header("authorization"))
+            if denied:
+                return await self.send_json(req, send, *denied)
+            status, body = await asyncio.get_running_loop().run_in_executor(None, site.query_leads, req.args)
+            return await self.send_json(req, send, status, body)
+        if path == "/api/leads/export":
+            denied = site.check_admin(req.header("authorization"))
+            if denied:
+                return await self.send_json(req, send, *denied)
+            status, headers, body = site.export_leads(req.args)
+            if status != 200:
+                return await self.send_json(req, send, status, body)
+            return await self.stream_chunks(req, send, headers, body)
+        if path.startswith("/data/"):
+            return await self.data_file(req, send, path[len("/data/"):])
+        rel = "index.html" if path == "/" else unquote(path.lstrip("/"))
+        # Security: only paths in the startup-built index are servable
+        if rel not in site.routes:
+            raise HTTPError(404)
+        return await self.static(req, send, rel)
+
+    async def lead(self, req: Request, send):
+        if self.draining:
+            return await self.send_json(req, send, 503, {"ok": False, "error": "unavailable"})
+        payload = await req.json()
+        loop = asyncio.get_running_loop()
+        # Why: the dedupe check may refresh the lead index from disk
+        record, status, body = await loop.run_in_executor(None, site.prepare_lead, payload)
+        if record is not None:
+            task = asyncio.ensure_future(self.persist(record))
+            self.inflight.add(task)
+            task.add_done_callback(self.inflight.discard)
+            # Why: a client hanging up must not cancel a write shutdown is waiting on
+            status, body = await asyncio.shield(task)
+        return await self.send_json(req, send, status, body)
+
+    async def persist(self, record: dict):
+        try:
+            with metrics.span("lead_persist"):
+                await site.journal.append_async(record)
+        except (OSError, TimeoutError, JournalClosed):
+            return site.lead_failed(record)
+        site.lead_stored(record)
+        return 200, {"ok": True}
+
+    async def data_file(self, req: Request, send, fname: str):
+        if site.private_data(fname):
+            raise HTTPError(404)
+        # Security: prevent path traversal; safe_join returns None on escape
+        safe_path = site.safe_join(str(site.BASE / "data"), fname)
+        if safe_path is None:
+            raise HTTPError(403)
+        if safe_path.endswith(".json"):
+            entry = site.docs.get(Path(safe_path))
+            if entry is None:
+                raise HTTPError(404)
+            return await self.send(req, send, *site.conditional(entry["body"], entry["etag"], "application/json",
+                                                               req.header("if-none-match")))
+        return await self.stream_file(req, send, Path(safe_path))
+
+    async def static(self, req: Request, send, rel: str):
+        rel, negotiated = site.pick_variant(rel, req.header("accept"), req.args.get("w") or req.header("sec-ch-width")
+                                            or req.header("width"))
+        vary = ", ".join(site.VARIANT_VARY) if negotiated else ""
+        if site.ASSET_CACHE_ENABLED and not req.header("range"):
+            cache = site.asset_cache
+            entry = cache.cached(rel) or await asyncio.get_running_loop().run_in_executor(None, cache.get, rel)
+            if entry is not None:
+                status, headers, body = cache.negotiate(entry, req.header("accept-encoding"), req.header("if-none-match"))
+                if vary:
+                    headers["Vary"] = ", ".join(filter(None, (headers.get("Vary"), vary)))
+                return await self.send(req, send, status, headers, body)
+        return await self.stream_file(req, send, site.BASE / rel, vary)
+
+    # -- responses -----------------------------------------------------------
+
+    async def stream_file(self, req: Request, send, path: Path, vary: str = ""):
+        loop = asyncio.get_running_loop()
+        try:
+            fh = await loop.run_in_executor(None, open, path, "rb")
+        except OSError:
+            raise HTTPError(404) from None
+        try:
+            st = os.fstat(fh.fileno())
+            etag = f"{st.st_mtime_ns:x}-{st.st_size:x}"
+            mimetype = site.get_content_type(mimetypes.guess_type(path.name)[0] or "application/octet-stream", "utf-8")
+            headers = {"Content-Type": mimetype, "ETag": f'"{etag}"',
+                       "Last-Modified": formatdate(st.st_mtime, usegmt=True), "Accept-Ranges": "bytes"}
+            if vary:
+                headers["Vary"] = vary
+            if etag in site.parse_etags(req.header("if-none-match")):
+                return await self.send(req, send, 304, headers)
+            if site.SENDFILE == "x-accel":
+                headers["X-Accel-Redirect"] = quote(site.X_ACCEL_PREFIX + path.relative_to(site.BASE).as_posix())
+                return await self.send(req, send, 200, headers)
+            if site.SENDFILE == "x-sendfile":
+                headers["X-Sendfile"] = str(path)
+                return await self.send(req, send, 200, headers)
+            ranges = site.byte_ranges(req.header("range"), req.header("if-range"), etag, st.st_mtime, st.st_size)
+            status, extra, pieces = site.file_plan(st, mimetype, ranges)
+            headers.update(extra)
+            await self.start(req, send, status, headers)
+            if req.method == "HEAD" or not pieces:
+                return await send({"type": "http.response.body", "body": b""})
+            zerocopy = "http.response.zerocopysend" in req.scope.get("extensions", {})
+            for i, piece in enumerate(pieces):
+                more = i < len(pieces) - 1
+                if isinstance(piece, bytes):
+                    await send({"type": "http.response.body", "body": piece, "more_body": more})
+                elif zerocopy:
+                    # Why: servers with this extension hand the fd to os.sendfile
+                    await send({"type": "http.response.zerocopysend", "file": fh.fileno(), "offset": piece[0],
+                                "count": piece[1] - piece[0], "more_body": more})
+                else:
+                    await self.send_span(send, fh, piece, more)
+        finally:
+            fh.close()
+
+    async def send_span(self, send, fh, span: tuple, more: bool):
+        loop = asyncio.get_running_loop()
+        pos, stop = span
+        while pos < stop:
+            chunk = await loop.run_in_executor(None, os.pread, fh.fileno(), min(CHUNK, stop - pos), pos)
+            if not chunk:
+                break  # Why: file shrank under us; Content-Length is already sent, so just stop
+            pos += len(chunk)
+            await send({"type": "http.response.body", "body": chunk, "more_body": more or pos < stop})
+
+    async def stream_chunks(self, req: Request, send, headers: dict, chunks):
+        """200 with a body pulled from a blocking iterator of bytes, one chunk per executor hop."""
+        loop = asyncio.get_running_loop()
+        try:
+            await self.start(req, send, 200, headers)
+            if req.method == "HEAD":
+                return await send({"type": "http.response.body", "body": b""})
+            while True:
+                chunk = await loop.run_in_executor(None, next, chunks, None)
+                if chunk is None:
+                    break
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            chunks.close()
+
+    async def send_json(self, req: Request, send, status: int, obj):
+        await self.send(req, send, status, {"Content-Type": "application/json"}, json.dumps(obj).encode())
+
+    async def send(self, req: Request, send, status: int, headers: dict, body: bytes = b""):
+        if status != 304:
+            headers["Content-Length"] = str(len(body))
+        await self.start(req, send, status, headers)
+        await send({"type": "http.response.body", "body": b"" if req.method == "HEAD" else body})
+
+    async def start(self, req: Request, send, status: int, headers: dict):
+        mimetype = headers.get("Content-Type", "").split(";")[0]
+        if headers.get("Cache-Control") != "no-store":
+            headers["Cache-Control"] = site.cache_policy(req.path, status, mimetype,
+                                                         headers.get("Cache-Control") == "no-cache")
+        headers.setdefault("Access-Control-Allow-Origin", os.getenv("CORS_ORIGIN", "http://localhost:3000"))
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()]})
+
+application = Server()
+
+if __name__ == "__main__":
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("❌ uvicorn is not installed: pip install uvicorn")
+    uvicorn.run("asgi:application", host="0.0.0.0", port=int(os.environ.get("PORT", 5000)),
+                workers=ASGI_WORKERS, limit_concurrency=ASGI_CONCURRENCY,
+                timeout_graceful_shutdown=ASGI_SHUTDOWN_TIMEOUT, lifespan="on", access_log=False)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""Benchmark make_transparent_black against the old per-pixel loop.
+
+Usage: python bench/bench_keying.py [--size 3840x2160] [--repeat 3]
+"""
+import argparse, os, sys, time, tracemalloc, warnings
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tools"))
+from smartflo_brand_pack import make_transparent_black  # noqa: E402
+
+def legacy_make_transparent_black(im, threshold=25):
+    im = im.convert("RGBA")
+    new = []
+    warnings.simplefilter("ignore", DeprecationWarning)
+    for r,g,b,a in im.getdata():
+        if r<threshold and g<threshold and b<threshold:
+            new.append((0,0,0,0))
+        else:
+            new.append((r,g,b,a))
+    out = Image.new("RGBA", im.size); out.putdata(new); return out
+
+def sample_logo(w, h):
+    """Gold-ish shape on black with a dark gradient edge, like the brand logo."""
+    im = Image.linear_gradient("L").resize((w, h)).convert("RGBA")
+    r, g, b, a = im.split()
+    return Image.merge("RGBA", (r, g.point(lambda v: v * 3 // 4), b.point(lambda v: v // 3), a))
+
+def measure(fn, im, repeat):
+    best, peak = float("inf"), 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        t = time.perf_counter()
+        out = fn(im)
+        best = min(best, time.perf_counter() - t)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return out, best, peak
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--size", default="3840x2160")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--skip-legacy", action="store_true")
+    args = p.parse_args()
+    w, h = (int(x) for x in args.size.lower().split("x"))
+    im = sample_logo(w, h)
+
+    new, t_new, m_new = measure(make_transparent_black, im, args.repeat)
+    print(f"vectorized  {t_new*1000:9.1f} ms  peak {m_new/1e6:8.1f} MB Python heap")
+    _, t_soft, m_soft = measure(lambda x: make_transparent_black(x, feather=16), im, args.repeat)
+    print(f"feathered   {t_soft*1000:9.1f} ms  peak {m_soft/1e6:8.1f} MB Python heap")
+    if not args.skip_legacy:
+        old, t_old, m_old = measure(legacy_make_transparent_black, im, 1)
+        print(f"per-pixel   {t_old*1000:9.1f} ms  peak {m_old/1e6:8.1f} MB Python heap")
+        print(f"speedup     {t_old/t_new:9.1f}x   identical output: {old.tobytes() == new.tobytes()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Load-test the WSGI (app.py) and ASGI (asgi.py) servers side by side.
+
+Starts each server on a local port, drives it with keep-alive clients for a
+fixed duration per path and prints requests/s with p50/p99 latency.
+
+Usage: python bench/bench_serving.py [--clients 32] [--duration 5] [--paths / /health ...]
+       [--lead]  # also POST /lead with unique emails (writes to data/leads.jsonl)
+"""
+import argparse, http.client, json, os, subprocess, sys, threading, time, uuid
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SERVERS = {
+    "wsgi": [sys.executable, "app.py"],
+    "asgi": [sys.executable, "asgi.py"],
+}
+
+def wait_ready(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            conn.getresponse().read()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+def percentile(sorted_vals, q):
+    if not sorted_vals:
+        return 0.0
+    return sorted_vals[min(len(sorted_vals) - 1, int(q * len(sorted_vals)))]
+
+def drive(port, method, path, clients, duration):
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        mine, failed = [], 0
+        while time.monotonic() < stop_at:
+            body, headers = None, {"Accept-Encoding": "gzip, br"}
+            if method == "POST":
+                body = json.dumps({"name": "bench", "email": f"{uuid.uuid4().hex}@bench.local"})
+                headers["Content-Type"] = "application/json"
+            t = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                resp = conn.getresponse()
+                resp.read()
+                ok = resp.status < 500
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+                ok = False
+            if ok:
+                mine.append(time.perf_counter() - t)
+            else:
+                failed += 1
+        conn.close()
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.perf_counter()
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {"rps": len(latencies) / elapsed, "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000, "errors": errors[0]}
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--servers", nargs="*", default=list(SERVERS), choices=list(SERVERS))
+    p.add_argument("--paths", nargs="*", default=["/", "/health", "/assets/ui.css", "/site.config.json"])
+    p.add_argument("--lead", action="store_true", help="also benchmark POST /lead")
+    p.add_argument("--clients", type=int, default=32)
+    p.add_argument("--duration", type=float, default=5.0)
+    p.add_argument("--port", type=int, default=5099)
+    args = p.parse_args()
+
+    cases = [("GET", path) for path in args.paths] + ([("POST", "/lead")] if args.lead else [])
+    results = {}
+    for name in args.servers:
+        env = {**os.environ, "PORT": str(args.port), "LEAD_DEDUPE_WINDOW": "0"}
+        proc = subprocess.Popen(SERVERS[name], cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not wait_ready(args.port):
+                print(f"❌ {name} did not come up on :{args.port}")
+                continue
+            for method, path in cases:
+                results[(name, method, path)] = r = drive(args.port, method, path, args.clients, args.duration)
+                print(f"{name:<5} {method:<4} {path:<24} {r['rps']:9.0f} req/s  p50 {r['p50_ms']:7.2f} ms"
+                      f"  p99 {r['p99_ms']:7.2f} ms  errors {r['errors']}")
+        finally:
+            proc.terminate()
+            proc.wait(15)
+
+    if "wsgi" in args.servers and "asgi" in args.servers:
+        print()
+        for method, path in cases:
+            w, a = results.get(("wsgi", method, path)), results.get(("asgi", method, path))
+            if w and a and w["rps"]:
+                print(f"{method} {path:<24} asgi/wsgi throughput {a['rps'] / w['rps']:5.2f}x"
+                      f"  p99 {w['p99_ms']:.2f} → {a['p99_ms']:.2f} ms")
+
+if __name__ == "__main__":
+    main()
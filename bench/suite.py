@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""Reproducible benchmark suite for the Python services.
+
+Every case runs in its own subprocess against a sandbox of the site (symlinks
+into this tree plus a private data/ dir), so /lead bursts never touch the real
+journal and peak RSS is per case. Cases run a fixed number of operations, not
+a fixed duration, so runs are comparable.
+
+Usage:
+  python bench/suite.py [--cases health_inproc lead_socket ...] [--quick] [--out results.json]
+  python bench/suite.py --out bench/baseline.json              # store a baseline
+  python bench/suite.py --compare bench/baseline.json           # run and flag regressions
+  python bench/suite.py --compare bench/baseline.json --results results.json  # compare stored runs
+  python bench/suite.py --list
+"""
+import argparse, contextlib, http.client, json, os, platform, resource, shutil, subprocess, sys, tempfile
+import threading, time, uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH)
+sys.path.insert(0, BENCH)
+from bench_serving import percentile, wait_ready  # noqa: E402
+
+SKIP_IN_SANDBOX = {".git", "data", "bench", "__pycache__", "node_modules"}
+CASES = {}
+
+def case(fn):
+    CASES[fn.__name__] = fn
+    return fn
+
+# -- sandbox -------------------------------------------------------------------
+
+def make_sandbox() -> str:
+    box = tempfile.mkdtemp(prefix="sfs-bench-")
+    for name in os.listdir(ROOT):
+        if name not in SKIP_IN_SANDBOX:
+            os.symlink(os.path.join(ROOT, name), os.path.join(box, name))
+    os.mkdir(os.path.join(box, "data"))
+    for name in os.listdir(os.path.join(ROOT, "data")):
+        if name.endswith(".json"):
+            shutil.copy2(os.path.join(ROOT, "data", name), os.path.join(box, "data", name))
+    return box
+
+def data_json(box: str) -> str:
+    names = sorted(n for n in os.listdir(os.path.join(box, "data")) if n.endswith(".json") and not n.startswith("leads"))
+    return "/data/" + (names[0] if names else "site.json")
+
+def lead_body() -> bytes:
+    return json.dumps({"name": "bench", "email": f"{uuid.uuid4().hex}@bench.local", "plan": "starter"}).encode()
+
+def peak_rss_mb(pid: int = 0) -> float:
+    """Peak resident set of this process, or of ``pid`` via /proc (Linux)."""
+    if pid:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            return 0.0
+        return 0.0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+# -- load helpers --------------------------------------------------------------
+
+def run_threads(clients: int, per_client: int, one) -> tuple:
+    """Call ``one(state)`` per_client times on each of ``clients`` threads; returns (latencies, wall seconds)."""
+    out, lock = [], threading.Lock()
+
+    def worker():
+        state, mine = {}, []
+        for _ in range(per_client):
+            t = time.perf_counter()
+            one(state)
+            mine.append(time.perf_counter() - t)
+        with lock:
+            out.extend(mine)
+        if "close" in state:
+            state["close"]()
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    started = time.perf_counter()
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    return out, time.perf_counter() - started
+
+def inproc(box: str, method: str, path: str, clients: int, per_client: int) -> tuple:
+    sys.path.insert(0, box)
+    os.chdir(box)
+    import app  # noqa: the sandbox copy, so data/ is private
+
+    def one(state):
+        client = state.get("client") or state.setdefault("client", app.app.test_client())
+        if method == "POST":
+            resp = client.post(path, data=lead_body(), content_type="application/json")
+        else:
+            resp = client.get(path, headers={"Accept-Encoding": "gzip, br"})
+        if resp.status_code >= 500:
+            raise RuntimeError(f"{method} {path} → {resp.status_code}")
+        resp.close()
+
+    one({})  # Why: first request pays for lazy imports; keep it out of the numbers
+    return run_threads(clients, per_client, one)
+
+def over_socket(box: str, method: str, path: str, clients: int, per_client: int, server: str = "app.py"):
+    port = 5300 + os.getpid() % 500
+    env = {**os.environ, "PORT": str(port), "LEAD_DEDUPE_WINDOW": "0"}
+    proc = subprocess.Popen([sys.executable, server], cwd=box, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_ready(port):
+            raise RuntimeError(f"{server} did not come up on :{port}")
+
+        def one(state):
+            conn = state.get("conn")
+            if conn is None:
+                conn = state["conn"] = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                state["close"] = conn.close
+            body = lead_body() if method == "POST" else None
+            conn.request(method, path, body=body,
+                         headers={"Accept-Encoding": "gzip, br", "Content-Type": "application/json"})
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status >= 500:
+                raise RuntimeError(f"{method} {path} → {resp.status}")
+
+        latencies, wall = run_threads(clients, per_client, one)
+        return latencies, wall, peak_rss_mb(proc.pid)
+    finally:
+        proc.terminate()
+        proc.wait(15)
+
+# -- cases ---------------------------------------------------------------------
+
+@case
+def static_inproc(box, scale):
+    return inproc(box, "GET", "/assets/ui.css", 1, int(3000 * scale))
+
+@case
+def health_inproc(box, scale):
+    return inproc(box, "GET", "/health", 1, int(5000 * scale))
+
+@case
+def data_json_inproc(box, scale):
+    return inproc(box, "GET", data_json(box), 1, int(5000 * scale))
+
+@case
+def lead_inproc(box, scale):
+    os.environ["LEAD_DEDUPE_WINDOW"] = "0"
+    return inproc(box, "POST", "/lead", 16, int(100 * scale))
+
+@case
+def static_socket(box, scale):
+    return over_socket(box, "GET", "/assets/ui.css", 16, int(250 * scale))
+
+@case
+def health_socket(box, scale):
+    return over_socket(box, "GET", "/health", 16, int(250 * scale))
+
+@case
+def data_json_socket(box, scale):
+    return over_socket(box, "GET", data_json(box), 16, int(250 * scale))
+
+@case
+def lead_socket(box, scale):
+    return over_socket(box, "POST", "/lead", 32, int(50 * scale))
+
+@case
+def keying(box, scale):
+    sys.path.insert(0, os.path.join(ROOT, "tools"))
+    from bench_keying import sample_logo
+    from smartflo_brand_pack import make_transparent_black
+    im = sample_logo(1920, 1080)
+    make_transparent_black(im)
+    return run_threads(1, max(3, int(20 * scale)), lambda state: make_transparent_black(im))
+
+def _brand_pack(box, repeat, force):
+    sys.path.insert(0, os.path.join(ROOT, "tools"))
+    from bench_keying import sample_logo
+    import smartflo_brand_pack as bp
+    work = tempfile.mkdtemp(prefix="brand-", dir=box)
+    src = os.path.join(work, "logo.png")
+    sample_logo(1600, 1000).save(src)
+    og, icons = os.path.join(work, "og"), os.path.join(work, "icons")
+    bp.ensure_dirs([og, icons])
+    targets = bp.brand_targets(og, icons, (1600, 1000))
+    cache = os.path.join(og, bp.CACHE_FILE)
+    bp.build(targets, src, cache)  # Why: warm the cache (and the pool's imports) before timing
+    return run_threads(1, repeat, lambda state: bp.build(targets, src, cache, force=force))
+
+@case
+def brand_pack_cold(box, scale):
+    return _brand_pack(box, max(1, int(3 * scale)), force=True)
+
+@case
+def brand_pack_cached(box, scale):
+    return _brand_pack(box, max(5, int(50 * scale)), force=False)
+
+class _StubAPI(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    delay = 0.005  # Why: roughly a fast real API round trip, so concurrency shows up
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.delay)
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+def _dispatch(scale, concurrency):
+    sys.path.insert(0, os.path.join(ROOT, "scripts"))
+    import dispatch_workflows as dw
+    stub = ThreadingHTTPServer(("127.0.0.1", 0), _StubAPI)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    api = f"http://127.0.0.1:{stub.server_address[1]}"
+    try:
+        with open(os.devnull, "w") as null, contextlib.redirect_stdout(null):
+            if concurrency == 1:
+                session = dw.make_session(1)
+                return run_threads(1, int(200 * scale), lambda state: dw.dispatch(
+                    "acme", "site", "main", "ci.yml", "t", {}, session=session, api=api))
+            rows = [{"owner": "acme", "repo": f"r{i}"} for i in range(int(400 * scale))]
+            t = time.perf_counter()
+            results = dw.dispatch_all(rows, "t", {}, concurrency=concurrency, per_host=concurrency, api=api)
+            return [r["latency_ms"] / 1000 for r in results], time.perf_counter() - t
+    finally:
+        stub.shutdown()
+
+@case
+def dispatch_sequential(box, scale):
+    return _dispatch(scale, 1)
+
+@case
+def dispatch_concurrent(box, scale):
+    return _dispatch(scale, 8)
+
+# -- runner --------------------------------------------------------------------
+
+def summarize(latencies: list, elapsed: float, rss: float, server_rss) -> dict:
+    lat = sorted(latencies)
+    out = {"ops": len(lat), "seconds": round(elapsed, 4),
+           "throughput": round(len(lat) / elapsed, 2) if elapsed else 0.0,
+           "p50_ms": round(percentile(lat, 0.50) * 1000, 3), "p95_ms": round(percentile(lat, 0.95) * 1000, 3),
+           "p99_ms": round(percentile(lat, 0.99) * 1000, 3), "peak_rss_mb": round(rss, 1)}
+    if server_rss:
+        out["server_peak_rss_mb"] = round(server_rss, 1)
+    return out
+
+def run_case(name: str, box: str, scale: float, result_path: str) -> None:
+    # Why: cases return (latencies, wall seconds[, server peak RSS]); setup and imports stay untimed
+    latencies, wall, *server_rss = CASES[name](box, scale)
+    with open(result_path, "w") as f:
+        json.dump(summarize(latencies, wall, peak_rss_mb(), server_rss[0] if server_rss else None), f)
+
+def run_suite(names: list, scale: float) -> dict:
+    box = make_sandbox()
+    results = {}
+    try:
+        for name in names:
+            with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as tmp:
+                result_path = tmp.name
+            proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--run-case", name, "--sandbox", box,
+                                   "--scale", str(scale), "--result", result_path],
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+            try:
+                with open(result_path) as f:
+                    results[name] = json.load(f)
+            except (OSError, ValueError):
+                results[name] = {"error": (proc.stderr.strip().splitlines() or ["failed"])[-1]}
+            finally:
+                os.unlink(result_path)
+            print_row(name, results[name])
+    finally:
+        shutil.rmtree(box, ignore_errors=True)
+    return results
+
+def print_row(name: str, r: dict) -> None:
+    if "error" in r:
+        print(f"❌ {name:<22} {r['error']}", file=sys.stderr)
+        return
+    print(f"{name:<22} {r['throughput']:>10.1f} ops/s  p50 {r['p50_ms']:>8.2f}  p95 {r['p95_ms']:>8.2f}"
+          f"  p99 {r['p99_ms']:>8.2f} ms  rss {r['peak_rss_mb']:>6.1f} MB", file=sys.stderr)
+
+def git_rev() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+def compare(base: dict, current: dict, threshold: float) -> list:
+    """Regressions as (case, metric, baseline, current) beyond ``threshold`` (a fraction)."""
+    worse = []
+    for name, cur in current.get("results", {}).items():
+        old = base.get("results", {}).get(name)
+        if not old or "error" in old or "error" in cur:
+            continue
+        if old["throughput"] and cur["throughput"] < old["throughput"] * (1 - threshold):
+            worse.append((name, "throughput", old["throughput"], cur["throughput"]))
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "peak_rss_mb", "server_peak_rss_mb"):
+            if old.get(metric) and cur.get(metric, 0) > old[metric] * (1 + threshold):
+                worse.append((name, metric, old[metric], cur[metric]))
+    return worse
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--cases", nargs="*", default=list(CASES), choices=list(CASES))
+    p.add_argument("--quick", action="store_true", help="run a fifth of the operations")
+    p.add_argument("--out", help="write results JSON here (default: stdout)")
+    p.add_argument("--compare", metavar="BASELINE", help="flag regressions against a stored run")
+    p.add_argument("--results", help="with --compare: use this stored run instead of running the suite")
+    p.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown before flagging (0.10 = 10%%)")
+    p.add_argument("--list", action="store_true")
+    p.add_argument("--run-case", help=argparse.SUPPRESS)
+    p.add_argument("--sandbox", help=argparse.SUPPRESS)
+    p.add_argument("--scale", type=float, default=1.0, help=argparse.SUPPRESS)
+    p.add_argument("--result", help=argparse.SUPPRESS)
+    args = p.parse_args()
+
+    if args.list:
+        print("\n".join(CASES)); return
+    if args.run_case:
+        run_case(args.run_case, args.sandbox, args.scale, args.result); return
+
+    if args.compare and args.results:
+        with open(args.results) as f:
+            current = json.load(f)
+    else:
+        scale = 0.2 if args.quick else 1.0
+        current = {"meta": {"git": git_rev(), "python": platform.python_version(), "platform": platform.platform(),
+                            "cpus": os.cpu_count(), "scale": scale, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())},
+                   "results": run_suite(args.cases, scale)}
+        text = json.dumps(current, indent=2, sort_keys=True)
+        if args.out:
+            with open(args.out, "w") as f:
+                f.write(text + "\n")
+        elif not args.compare:
+            print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            base = json.load(f)
+        if base.get("meta", {}).get("scale") != current.get("meta", {}).get("scale"):
+            print("⚠️  baseline and current run used different --quick settings", file=sys.stderr)
+        worse = compare(base, current, args.threshold)
+        for name, metric, old, new in worse:
+            print(f"🔻 {name} {metric}: {old} → {new}")
+        print(f"{'❌' if worse else '✅'} {len(worse)} regression(s) beyond {args.threshold:.0%}")
+        sys.exit(1 if worse else 0)
+
+if __name__ == "__main__":
+    main()
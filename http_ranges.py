@@ -0,0 +1,80 @@
+"""Range/If-Range planning and positional streaming for served files.
+
+Shared by app.py's ``serve_file`` and asgi.py's ``stream_file``. It needs
+only werkzeug's header parsers, not Flask, so the rules can be tested alone.
+"""
+from __future__ import annotations
+import os, uuid
+from werkzeug.http import parse_if_range_header, parse_range_header
+
+STREAM_CHUNK = 256 * 1024
+MAX_RANGES = 16
+
+def byte_ranges(range_header: str, if_range: str, etag: str, mtime: float, size: int):
+    """Ranges to send as [(start, stop), ...]; None means the whole file, [] means 416."""
+    if not range_header:
+        return None
+    if if_range:
+        cond = parse_if_range_header(if_range)
+        if cond.etag is not None:
+            fresh = cond.etag == etag
+        else:
+            fresh = cond.date is not None and int(mtime) == int(cond.date.timestamp())
+        if not fresh:
+            return None  # Why: the client's copy is stale, so partial bytes would corrupt it
+    rng = parse_range_header(range_header)
+    if rng is None or rng.units != "bytes":
+        return None  # Why: RFC 9110 says ignore a Range we can't parse
+    spans = []
+    for begin, end in rng.ranges:
+        start, stop = (max(size + begin, 0), size) if begin < 0 else (begin, min(end or size, size))
+        if start < stop:
+            spans.append((start, stop))
+    spans.sort()
+    merged = []
+    for start, stop in spans:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+    # Why: hundreds of tiny ranges are an amplification trick; the whole file is cheaper
+    return None if len(merged) > MAX_RANGES else merged
+
+def file_plan(st, mimetype: str, ranges):
+    """(status, headers, pieces) for a file; pieces are bytes or (start, stop) spans of the file."""
+    size = st.st_size
+    if ranges is None:
+        return 200, {"Content-Length": str(size)}, [(0, size)]
+    if not ranges:
+        return 416, {"Content-Range": f"bytes */{size}", "Content-Length": "0"}, []
+    if len(ranges) == 1:
+        start, stop = ranges[0]
+        return 206, {"Content-Range": f"bytes {start}-{stop - 1}/{size}", "Content-Length": str(stop - start)}, ranges
+    boundary = uuid.uuid4().hex
+    pieces = []
+    for start, stop in ranges:
+        pieces.append(f"\r\n--{boundary}\r\nContent-Type: {mimetype}\r\n"
+                      f"Content-Range: bytes {start}-{stop - 1}/{size}\r\n\r\n".encode())
+        pieces.append((start, stop))
+    pieces.append(f"\r\n--{boundary}--\r\n".encode())
+    length = sum(len(p) if isinstance(p, bytes) else p[1] - p[0] for p in pieces)
+    return 206, {"Content-Type": f"multipart/byteranges; boundary={boundary}", "Content-Length": str(length)}, pieces
+
+def file_chunks(f, pieces):
+    """Stream ``pieces`` of ``f`` with positional reads, one ``STREAM_CHUNK`` in flight."""
+    try:
+        fd = f.fileno()
+        for piece in pieces:
+            if isinstance(piece, bytes):
+                yield piece
+                continue
+            pos, stop = piece
+            while pos < stop:
+                # Why: pread, not mmap; a file truncated mid-send would SIGBUS the whole process
+                chunk = os.pread(fd, min(STREAM_CHUNK, stop - pos), pos)
+                if not chunk:
+                    return  # Why: file shrank under us; Content-Length is already sent, so just stop
+                pos += len(chunk)
+                yield chunk
+    finally:
+        f.close()
@@ -0,0 +1,220 @@
+"""Request timing, hot-path spans and a Prometheus text endpoint.
+
+:func:`instrument_flask` adds per-route latency histograms, an in-flight gauge,
+response-size histograms and a ``/metrics`` route to a Flask app. Code on the
+hot path times itself with ``with span("lead_persist"):``, and subsystems with
+their own counters (caches, journal, notifier) register a collector that is
+only called when ``/metrics`` is scraped.
+
+Recording is a ``perf_counter`` pair, a bisect and a short lock, so it stays
+on in production. Metrics are per process; scrape each worker.
+
+Profiling is opt-in: with ``PROFILE_TOKEN`` set, a request carrying
+``X-Profile: <token>`` runs under cProfile (or pyinstrument with
+``PROFILER=pyinstrument``) and the result is written to ``PROFILE_DIR``.
+"""
+from __future__ import annotations
+import cProfile, hmac, os, re, threading, time
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILER = os.getenv("PROFILER", "cprofile")
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", Path(__file__).parent / "state" / "profiles"))
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(labels: tuple, extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _le(bound) -> str:
+    return 'le="%s"' % bound
+
+def _num(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class Metrics:
+    def __init__(self, prefix: str = "sfs"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._hists: dict = {}     # (name, labels) -> Histogram
+        self._counters: dict = {}  # (name, labels) -> number
+        self._gauges: dict = {}
+        self._collectors: list = []
+
+    def observe(self, name: str, value: float, buckets: tuple = LATENCY_BUCKETS, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._hists.get(key)
+            if hist is None:
+                hist = self._hists[key] = Histogram(buckets)
+            hist.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def gauge(self, name: str, delta: float, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + delta
+
+    def collect(self, fn) -> None:
+        """Register ``fn() -> iterable of (name, "counter"|"gauge", labels dict, value)``."""
+        self._collectors.append(fn)
+
+    @contextmanager
+    def span(self, name: str):
+        """Time a block into ``<prefix>_span_seconds{span=name}``, errors included."""
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("span_seconds", time.perf_counter() - t, span=name)
+
+    def render(self) -> str:
+        with self._lock:
+            hists = [(k, h.buckets, list(h.counts), h.sum, h.count) for k, h in self._hists.items()]
+            samples = [(k, "counter", v) for k, v in self._counters.items()]
+            samples += [(k, "gauge", v) for k, v in self._gauges.items()]
+        for fn in self._collectors:
+            try:
+                for name, kind, labels, value in fn():
+                    samples.append(((name, tuple(sorted(labels.items()))), kind, value))
+            except Exception:  # Why: a broken collector must not take /metrics down
+                continue
+        out, typed = [], set()
+        for (name, labels), buckets, counts, total, count in sorted(hists, key=lambda h: h[0]):
+            full = f"{self.prefix}_{name}"
+            if full not in typed:
+                typed.add(full)
+                out.append(f"# TYPE {full} histogram")
+            running = 0
+            for le, n in zip(buckets, counts):
+                running += n
+                out.append(f"{full}_bucket{_labels(labels, _le(le))} {running}")
+            out.append(f"{full}_bucket{_labels(labels, _le('+Inf'))} {count}")
+            out.append(f"{full}_sum{_labels(labels)} {_num(total)}")
+            out.append(f"{full}_count{_labels(labels)} {count}")
+        for (name, labels), kind, value in sorted(samples, key=lambda s: s[0]):
+            full = f"{self.prefix}_{name}"
+            if full not in typed:
+                typed.add(full)
+                out.append(f"# TYPE {full} {kind}")
+            out.append(f"{full}{_labels(labels)} {_num(value)}")
+        return "\n".join(out) + "\n"
+
+metrics = Metrics()
+span = metrics.span
+
+# -- profiling -----------------------------------------------------------------
+
+def _profile_start():
+    if PROFILER == "pyinstrument":
+        try:
+            from pyinstrument import Profiler  # type: ignore
+        except ImportError:
+            pass
+        else:
+            prof = Profiler()
+            prof.start()
+            return prof
+    prof = cProfile.Profile()
+    prof.enable()
+    return prof
+
+def _profile_save(prof, label: str) -> str:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    stem = f"{time.strftime('%Y%m%dT%H%M%S')}-{re.sub(r'[^A-Za-z0-9_.-]+', '_', label).strip('_')[:80]}"
+    if isinstance(prof, cProfile.Profile):
+        prof.disable()
+        path = PROFILE_DIR / f"{stem}.prof"
+        prof.dump_stats(path)
+    else:
+        prof.stop()
+        path = PROFILE_DIR / f"{stem}.html"
+        path.write_text(prof.output_html(), encoding="utf-8")
+    return path.name
+
+def wants_profile(header: str) -> bool:
+    return bool(PROFILE_TOKEN and header) and hmac.compare_digest(header.encode(), PROFILE_TOKEN.encode())
+
+# -- Flask ---------------------------------------------------------------------
+
+def metrics_auth_ok(header: str) -> bool:
+    """``/metrics`` is open unless ``METRICS_TOKEN`` is set, then it needs that Bearer token."""
+    token = os.getenv("METRICS_TOKEN", "")
+    if not token:
+        return True
+    supplied = header[7:] if header.startswith("Bearer ") else header
+    return hmac.compare_digest(supplied.encode(), token.encode())
+
+def instrument_flask(app, registry: Metrics = metrics) -> None:
+    """Time every request of ``app`` and serve ``registry`` on ``/metrics``."""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start():
+        g._sfs_t0 = time.perf_counter()
+        registry.gauge("http_in_flight", 1)
+        if PROFILE_TOKEN and wants_profile(request.headers.get("X-Profile", "")):
+            g._sfs_prof = _profile_start()
+
+    @app.after_request
+    def _record(resp):
+        g._sfs_status = resp.status_code
+        route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+        size = resp.content_length
+        if size is None and resp.is_sequence:  # Why: never buffer a streamed body just to measure it
+            size = resp.calculate_content_length()
+        if size is not None:
+            registry.observe("http_response_bytes", size, SIZE_BUCKETS, route=route)
+        prof = g.pop("_sfs_prof", None)
+        if prof is not None:
+            resp.headers["X-Profile-Saved"] = _profile_save(prof, f"{request.method}{request.path}")
+        return resp
+
+    @app.teardown_request
+    def _finish(exc):
+        t0 = g.pop("_sfs_t0", None)
+        if t0 is None:
+            return
+        registry.gauge("http_in_flight", -1)
+        # Why: label by route rule, not raw path, so scanners can't explode cardinality
+        route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+        status = g.pop("_sfs_status", 500)
+        registry.observe("http_request_seconds", time.perf_counter() - t0,
+                         route=route, method=request.method, status=str(status // 100) + "xx")
+        prof = g.pop("_sfs_prof", None)
+        if prof is not None:
+            _profile_save(prof, f"{request.method}{request.path}")
+
+    @app.get("/metrics")
+    def metrics_endpoint():
+        if not metrics_auth_ok(request.headers.get("Authorization", "")):
+            return Response("forbidden\n", status=403, mimetype="text/plain")
+        resp = Response(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+        resp.cache_control.no_cache = True
+        return resp
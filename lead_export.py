@@ -0,0 +1,402 @@
+"""Streaming export and compaction of the lead history.
+
+Export is a generator pipeline: journal segments (``data/leads.jsonl`` and its
+rotated, possibly gzipped, segments) and the Node side's ``data/leads.json``
+are read record by record and filtered by date range and plan. The survivors
+are put in timestamp order by an external merge sort. Copies of one lead (same
+``id``, or byte-identical) collapse to the last one read, so ``leads.json``
+wins. Rows are then flattened to a fixed column set and serialized in chunks.
+Memory is bounded by ``run_records`` however long the history is:
+``leads.json`` is decoded one lead at a time instead of as one document.
+
+Formats: ``csv``; ``columns``, newline-delimited JSON where each line is one
+row group of up to ``chunk_rows`` rows stored as ``{"rows": n, "columns":
+{field: [...]}}``; and ``parquet`` (file output only, needs pyarrow), one row
+group per chunk.
+
+Compaction runs the same sort over every journal segment plus ``leads.json``
+and writes the result as one gzip segment. It holds the journal's
+cross-process lock and drops ``.leads.idx`` so the next
+:class:`lead_store.LeadStore` rebuilds from the compacted segment.
+``leads.json`` is only read: it is server.js's live store. LeadStore skips
+segment copies of leads that are still in it.
+
+    python lead_export.py export --format csv --since 2025-01-01 --plan pro > leads.csv
+    python lead_export.py compact
+"""
+from __future__ import annotations
+import argparse, csv, gzip, hashlib, heapq, io, itertools, json, os, re, sys, tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from lead_journal import fcntl, iter_records, journal_segments
+from lead_store import record_ts
+
+FIELDS = ("ts", "email", "name", "business", "plan", "goal", "source", "status", "phone", "id")
+# format -> (content type, file extension); parquet is file-only
+FORMATS = {"csv": ("text/csv; charset=utf-8", "csv"), "columns": ("application/x-ndjson", "ndjson")}
+CHUNK_ROWS = 10000
+CHUNK_BYTES = 64 * 1024
+RUN_RECORDS = 100000
+_WS = re.compile(r"\s*")
+_DECODER = json.JSONDecoder()
+
+# -- sources ---------------------------------------------------------------------
+
+class _Reader:
+    """Chunked text buffer that JSON values are decoded from one at a time."""
+
+    def __init__(self, f, chunk: int):
+        self.f = f
+        self.chunk = chunk
+        self.buf = ""
+        self.pos = 0
+
+    def _fill(self) -> bool:
+        # Why: read at least as much as is buffered, so one huge value costs O(n), not O(n^2)
+        data = self.f.read(max(self.chunk, len(self.buf) - self.pos))
+        if not data:
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character, "" at end of file."""
+        while True:
+            self.pos = _WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def value(self):
+        self.peek()  # Why: raw_decode doesn't skip leading whitespace
+        while True:
+            try:
+                obj, end = _DECODER.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            if end == len(self.buf) and self._fill():
+                continue  # Why: a number at the end of the buffer may be cut short
+            self.pos = end
+            return obj
+
+    def expect(self, ch: str) -> None:
+        if self.peek() != ch:
+            raise ValueError(f"expected {ch!r} at offset {self.pos}")
+        self.pos += 1
+
+def _array_items(r: _Reader):
+    r.expect("[")
+    while True:
+        ch = r.peek()
+        if ch == "]":
+            return
+        if ch == "":
+            raise ValueError("unterminated array")
+        if ch == ",":
+            r.pos += 1
+            continue
+        item = r.value()
+        if isinstance(item, dict):
+            yield item
+
+def iter_json_leads(path: Path, key: str = "leads", chunk: int = CHUNK_BYTES):
+    """Yield the lead dicts of ``{"leads": [...]}`` (or a bare array) one at a time.
+
+    Raises ValueError on a malformed document, possibly after yielding some leads.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        r = _Reader(f, chunk)
+        first = r.peek()
+        if first == "[":
+            yield from _array_items(r)
+        elif first == "{":
+            r.pos += 1
+            while r.peek() not in ("}", ""):
+                name = r.value()
+                r.expect(":")
+                if name == key and r.peek() == "[":
+                    yield from _array_items(r)
+                    return
+                r.value()
+                if r.peek() == ",":
+                    r.pos += 1
+        elif first:
+            raise ValueError("leads document is neither an object nor an array")
+
+def journal_records(data_dir: Path):
+    """Journal records, segment by segment in write order."""
+    for path in journal_segments(data_dir):
+        try:
+            for _, record in iter_records(path):
+                yield record
+        except FileNotFoundError:
+            # Why: gzipped by the rotating writer between listing and opening
+            gz = path.with_name(path.name + ".gz")
+            if gz.exists():
+                yield from (record for _, record in iter_records(gz))
+
+def json_records(path: Path, strict: bool = False):
+    """Leads from ``leads.json``; a missing file is empty, a malformed one ends the stream unless ``strict``."""
+    try:
+        yield from iter_json_leads(path)
+    except FileNotFoundError:
+        return
+    except ValueError:
+        if strict:
+            raise
+        print(f"⚠️  {path.name} is malformed; exporting the leads read before the error", file=sys.stderr)
+
+def iter_leads(data_dir: Path, since: str = "", until: str = "", plan: str = "", run_records: int = RUN_RECORDS):
+    """Matching leads from the journal and ``leads.json`` in timestamp order, one copy per lead."""
+    data_dir = Path(data_dir)
+    records = select(itertools.chain(journal_records(data_dir), json_records(data_dir / "leads.json")),
+                     since, until, plan)
+    for line in sorted_lines(records, {"duplicates": 0}, run_records):
+        yield json.loads(line)
+
+# -- pipeline --------------------------------------------------------------------
+
+def select(records, since: str = "", until: str = "", plan: str = ""):
+    """Filter on an inclusive ISO date range (prefixes allowed, as in LeadStore.query) and plan."""
+    plan = plan.strip().lower()
+    until = until + "\uffff" if until else ""
+    for rec in records:
+        ts = record_ts(rec)
+        if (since and ts < since) or (until and ts > until):
+            continue
+        if plan and str(rec.get("plan") or "").strip().lower() != plan:
+            continue
+        yield rec
+
+def _cell(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+def flatten(records, fields=FIELDS):
+    """One row per record; both lead shapes map onto the same columns."""
+    for rec in records:
+        derived = {"ts": record_ts(rec),
+                   "name": rec.get("name") or " ".join(filter(None, (rec.get("firstName"), rec.get("lastName")))),
+                   "business": rec.get("business") or rec.get("company")}
+        yield [_cell(derived[f] if f in derived else rec.get(f)) for f in fields]
+
+def csv_chunks(rows, fields=FIELDS, chunk_bytes: int = CHUNK_BYTES):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(fields)
+    for row in rows:
+        writer.writerow(row)
+        if buf.tell() >= chunk_bytes:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+def column_batches(rows, fields=FIELDS, chunk_rows: int = CHUNK_ROWS):
+    """``{field: [values]}`` for each run of up to ``chunk_rows`` rows."""
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, chunk_rows))
+        if not batch:
+            return
+        yield {f: list(col) for f, col in zip(fields, zip(*batch))}
+
+def column_chunks(rows, fields=FIELDS, chunk_rows: int = CHUNK_ROWS):
+    for cols in column_batches(rows, fields, chunk_rows):
+        yield (json.dumps({"rows": len(cols[fields[0]]), "columns": cols}, ensure_ascii=False) + "\n").encode("utf-8")
+
+def export(data_dir: Path, fmt: str = "csv", since: str = "", until: str = "", plan: str = "",
+           fields=FIELDS, chunk_rows: int = CHUNK_ROWS):
+    """Byte chunks of the filtered lead history in ``fmt`` ("csv" or "columns")."""
+    rows = flatten(iter_leads(data_dir, since, until, plan), fields)
+    if fmt == "csv":
+        return csv_chunks(rows, fields)
+    if fmt == "columns":
+        return column_chunks(rows, fields, chunk_rows)
+    raise ValueError(f"unknown export format {fmt!r}")
+
+def write_parquet(out, data_dir: Path, since: str = "", until: str = "", plan: str = "",
+                  fields=FIELDS, chunk_rows: int = CHUNK_ROWS) -> int:
+    """Write a Parquet file with one row group per chunk; returns the row count."""
+    try:
+        import pyarrow as pa  # type: ignore
+        import pyarrow.parquet as pq  # type: ignore
+    except ImportError:
+        raise RuntimeError("parquet export needs pyarrow (pip install pyarrow); --format columns needs nothing") from None
+    schema = pa.schema([(f, pa.string()) for f in fields])
+    rows = flatten(iter_leads(data_dir, since, until, plan), fields)
+    total = 0
+    writer = pq.ParquetWriter(out, schema)
+    try:
+        for cols in column_batches(rows, fields, chunk_rows):
+            writer.write_table(pa.table(cols, schema=schema))
+            total += len(cols[fields[0]])
+    finally:
+        writer.close()
+    return total
+
+# -- external sort ---------------------------------------------------------------
+
+def _spill_run(run: list, tmp_dir: str) -> str:
+    run.sort(key=lambda e: (e[0], e[1]))
+    fd, path = tempfile.mkstemp(dir=tmp_dir, suffix=".run")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.writelines(f"{ts}\t{key}\t{line}\n" for ts, key, line in run)
+    return path
+
+def _sorted_runs(records, tmp_dir: str, run_records: int):
+    run = []
+    for rec in records:
+        line = json.dumps(rec, ensure_ascii=False)
+        # Why: the Node side's id survives edits, so a re-saved lead collapses onto its newest copy
+        ident = f"id:{rec['id']}" if rec.get("id") else line
+        ts = re.sub(r"[\t\n]", " ", record_ts(rec))
+        run.append((ts, hashlib.blake2b(ident.encode("utf-8"), digest_size=12).hexdigest(), line))
+        if len(run) >= run_records:
+            yield _spill_run(run, tmp_dir)
+            run = []
+    if run:
+        yield _spill_run(run, tmp_dir)
+
+def _merge_runs(paths: list, stats: dict):
+    """Lines of the sorted runs merged; of equal (ts, identity) entries the last one read wins."""
+    files = [open(p, "r", encoding="utf-8") for p in paths]
+    try:
+        streams = [(line.rstrip("\n").split("\t", 2) for line in f) for f in files]
+        prev = None
+        # Why: heapq.merge is stable, so duplicates arrive in input order
+        for entry in heapq.merge(*streams, key=lambda e: (e[0], e[1])):
+            if prev is not None and prev[:2] != entry[:2]:
+                yield prev[2]
+            elif prev is not None:
+                stats["duplicates"] += 1
+            prev = entry
+        if prev is not None:
+            yield prev[2]
+    finally:
+        for f in files:
+            f.close()
+
+def sorted_lines(records, stats: dict, run_records: int = RUN_RECORDS, tmp_dir=None):
+    """JSON lines of ``records`` in (ts, identity) order, sorted in runs of ``run_records`` spilled to disk."""
+    with tempfile.TemporaryDirectory(dir=tmp_dir, prefix=".leads-sort-") as tmp:
+        yield from _merge_runs(list(_sorted_runs(records, tmp, run_records)), stats)
+
+# -- compaction ------------------------------------------------------------------
+
+def compact(data_dir: Path, run_records: int = RUN_RECORDS) -> dict:
+    """Merge the journal segments and ``leads.json`` into one sorted, deduplicated segment.
+
+    The new segment is complete and fsynced before any journal file is removed,
+    so a crash part-way leaves duplicates for the next run to drop, never a gap.
+    ``leads.json`` is read, never rewritten.
+    """
+    data_dir = Path(data_dir)
+    json_path = data_dir / "leads.json"
+    stats = {"segments": 0, "records": 0, "duplicates": 0, "written": 0}
+    lock_fd = os.open(data_dir / ".leads.jsonl.lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)  # Why: journal writers can't append or rotate meanwhile
+        sources = [p for p in data_dir.glob("leads-*.jsonl*") if p.name.endswith((".jsonl", ".jsonl.gz"))]
+        active = data_dir / "leads.jsonl"
+        stats["segments"] = len(sources) + active.exists()
+        if not stats["segments"] and not json_path.exists():
+            return stats
+
+        def counted(records):
+            for rec in records:
+                stats["records"] += 1
+                yield rec
+
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        out = data_dir / f"leads-{stamp}.jsonl.gz"
+        part = out.with_name(out.name + ".tmp")
+        # Why: strict, so a half-written leads.json aborts instead of compacting half of it
+        records = counted(itertools.chain(journal_records(data_dir), json_records(json_path, strict=True)))
+        try:
+            with gzip.open(part, "wb") as gz:
+                for line in sorted_lines(records, stats, run_records, tmp_dir=data_dir):
+                    gz.write((line + "\n").encode("utf-8"))
+                    stats["written"] += 1
+                gz.flush()
+                os.fsync(gz.fileobj.fileno())
+        except BaseException:
+            part.unlink(missing_ok=True)
+            raise
+        os.replace(part, out)
+        for path in sources:
+            path.unlink(missing_ok=True)
+        if active.exists():
+            # Why: truncate, don't unlink; writers keep their O_APPEND fd and LeadStore sees a rotation
+            os.truncate(active, 0)
+        (data_dir / ".leads.idx").unlink(missing_ok=True)
+        stats["output"] = out.name
+        return stats
+    finally:
+        if fcntl is not None:
+            fcntl.flock(lock_fd, fcntl.LOCK_UN)
+        os.close(lock_fd)
+
+# -- CLI -------------------------------------------------------------------------
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Stream the lead history out as CSV/columnar chunks, or compact it")
+    ap.add_argument("--data", type=Path, default=Path(__file__).parent / "data", help="data directory")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ex = sub.add_parser("export", help="write leads to --out (default stdout)")
+    ex.add_argument("--format", choices=("csv", "columns", "parquet"), default="csv")
+    ex.add_argument("--since", default="", help="ISO date/time prefix, inclusive")
+    ex.add_argument("--until", default="", help="ISO date/time prefix, inclusive")
+    ex.add_argument("--plan", default="")
+    ex.add_argument("--fields", default=",".join(FIELDS), help="comma-separated columns")
+    ex.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="rows per columnar chunk / row group")
+    ex.add_argument("--out", default="-")
+    cp = sub.add_parser("compact", help="merge segments and leads.json into one sorted, deduplicated segment")
+    cp.add_argument("--run-records", type=int, default=RUN_RECORDS, help="records sorted in memory per run")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "compact":
+        try:
+            stats = compact(args.data, args.run_records)
+        except ValueError as e:
+            print(f"❌ leads.json is malformed, nothing changed: {e}", file=sys.stderr)
+            return 1
+        if "output" not in stats:
+            print("✅ Nothing to compact", file=sys.stderr)
+        else:
+            print(f"✅ {stats['segments']} segments + leads.json → {stats['output']}: {stats['written']} leads "
+                  f"({stats['duplicates']} duplicates dropped)", file=sys.stderr)
+        return 0
+
+    fields = tuple(f for f in args.fields.split(",") if f)
+    if args.format == "parquet":
+        if args.out == "-":
+            print("❌ parquet needs --out FILE", file=sys.stderr)
+            return 2
+        try:
+            n = write_parquet(args.out, args.data, args.since, args.until, args.plan, fields, args.chunk_rows)
+        except RuntimeError as e:
+            print(f"❌ {e}", file=sys.stderr)
+            return 1
+        print(f"✅ {n} leads → {args.out}", file=sys.stderr)
+        return 0
+    chunks = export(args.data, args.format, args.since, args.until, args.plan, fields, args.chunk_rows)
+    out = sys.stdout.buffer if args.out == "-" else open(args.out, "wb")
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,267 @@
+"""Append-only lead journal with group commit, rotation and crash recovery.
+
+A single writer thread owns ``data/leads.jsonl``. Callers of
+:meth:`LeadJournal.append` block (or await :meth:`LeadJournal.append_async`)
+until their record is on disk: the writer
+collects records for up to ``flush_ms`` (or ``max_batch`` records), writes the
+batch once, fsyncs once and then releases every waiter in it.
+
+The active file is rotated to ``leads-<UTC stamp>.jsonl`` when it passes
+``max_bytes`` or the UTC day changes, and rotated segments are gzipped in the
+background. On open, a torn trailing line left by a crash is truncated away;
+it was never acknowledged.
+"""
+from __future__ import annotations
+import asyncio, gzip, json, os, queue, shutil, threading, time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import fcntl  # type: ignore
+except ImportError:  # Why: Windows dev boxes; single-process there anyway
+    fcntl = None
+
+class JournalClosed(RuntimeError):
+    pass
+
+class _Pending:
+    __slots__ = ("line", "done")
+
+    def __init__(self, line: bytes):
+        self.line = line
+        self.done: Future = Future()
+
+def iter_records(path: Path):
+    """Yield ``(offset, record)`` for every complete, parseable line in a segment."""
+    opener = gzip.open if path.suffix == ".gz" else open
+    offset = 0
+    with opener(path, "rb") as f:
+        for raw in f:
+            start, offset = offset, offset + len(raw)
+            if not raw.endswith(b"\n"):
+                break  # Why: torn tail from a crash, never acknowledged
+            try:
+                yield start, json.loads(raw)
+            except ValueError:
+                continue
+
+def journal_segments(directory: Path, name: str = "leads.jsonl") -> list:
+    """Rotated segments of journal ``name`` oldest first, then the active file."""
+    directory, stem = Path(directory), Path(name).stem
+    found = {p.name for p in directory.glob(stem + "-*.jsonl*") if p.is_file()}
+    # Why: a crash between gzip and unlink leaves both; the .gz is complete
+    rotated = sorted(directory / n for n in found
+                     if n.endswith(".jsonl.gz") or (n.endswith(".jsonl") and n + ".gz" not in found))
+    active = directory / name
+    return rotated + ([active] if active.exists() else [])
+
+class LeadJournal:
+    def __init__(self, directory: Path, name: str = "leads.jsonl", flush_ms: float = 5.0,
+                 max_batch: int = 256, max_bytes: int = 64 * 1024 * 1024, rotate_daily: bool = True,
+                 compress: bool = True, fsync: bool = True):
+        self.dir = Path(directory)
+        self.path = self.dir / name
+        self.flush_s = flush_ms / 1000.0
+        self.max_batch = max_batch
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.compress = compress
+        self.fsync = fsync
+        self.stats = {"records": 0, "batches": 0, "rotations": 0, "recovered_bytes": 0}
+        self._queue: queue.Queue = queue.Queue()
+        self._closed = False
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._lock_fd = os.open(self.dir / f".{name}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        self._fd = -1
+        self._open()
+        self._thread = threading.Thread(target=self._run, name="lead-journal", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_env(cls, directory: Path) -> "LeadJournal":
+        return cls(
+            directory,
+            flush_ms=float(os.getenv("LEAD_JOURNAL_FLUSH_MS", "5")),
+            max_batch=int(os.getenv("LEAD_JOURNAL_MAX_BATCH", "256")),
+            max_bytes=int(os.getenv("LEAD_JOURNAL_MAX_BYTES", str(64 * 1024 * 1024))),
+            fsync=os.getenv("LEAD_JOURNAL_FSYNC", "1") != "0",
+        )
+
+    # -- public API ----------------------------------------------------------
+
+    def append(self, record: dict, timeout: float | None = 30.0) -> None:
+        """Persist ``record``; returns once it is durable, raises if it isn't."""
+        try:
+            self._submit(record).result(timeout)
+        except TimeoutError:
+            raise TimeoutError("lead journal commit timed out") from None
+
+    async def append_async(self, record: dict, timeout: float | None = 30.0) -> None:
+        """Awaitable :meth:`append`; the event loop keeps serving while the batch commits."""
+        try:
+            await asyncio.wait_for(asyncio.wrap_future(self._submit(record)), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError("lead journal commit timed out") from None
+
+    def _submit(self, record: dict) -> Future:
+        if self._closed:
+            raise JournalClosed("journal is closed")
+        item = _Pending((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+        self._queue.put(item)
+        return item.done
+
+    def segments(self) -> list:
+        """Rotated segments oldest first, then the active file."""
+        return journal_segments(self.dir, self.path.name)
+
+    def close(self, timeout: float = 10.0) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+        os.close(self._lock_fd)
+
+    # -- writer thread -------------------------------------------------------
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_s
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    nxt = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    stopping = True
+                    break
+                batch.append(nxt)
+            self._commit(batch)
+
+    def _commit(self, batch: list) -> None:
+        try:
+            with self._locked():
+                self._reopen_if_rotated()
+                self._maybe_rotate()
+                data = b"".join(p.line for p in batch)
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(self._fd, view):]
+                if self.fsync:
+                    os.fsync(self._fd)
+            self.stats["records"] += len(batch)
+            self.stats["batches"] += 1
+        except BaseException as e:  # Why: every waiter must be released, even on disk errors
+            for p in batch:
+                p.done.set_exception(e)
+        else:
+            for p in batch:
+                p.done.set_result(None)
+
+    # -- file management -----------------------------------------------------
+
+    def _open(self) -> None:
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        with self._locked():
+            self._recover()
+            # Why: a crash mid-gzip leaves a partial .gz.tmp; its plain segment is still there
+            for tmp in self.dir.glob(self.path.stem + "-*.jsonl.gz.tmp"):
+                tmp.unlink(missing_ok=True)
+        self._day = self._file_day()
+
+    @contextmanager
+    def _locked(self):
+        """Cross-process lock so worker processes never interleave or double-rotate."""
+        if fcntl is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _recover(self) -> None:
+        size = os.fstat(self._fd).st_size
+        if size == 0:
+            return
+        with open(self.path, "rb") as f:
+            pos = size
+            while pos > 0:
+                step = min(64 * 1024, pos)
+                f.seek(pos - step)
+                chunk = f.read(step)
+                if pos == size and chunk.endswith(b"\n"):
+                    return
+                nl = chunk.rfind(b"\n")
+                if nl >= 0:
+                    pos = pos - step + nl + 1
+                    break
+                pos -= step
+        os.truncate(self.path, pos)
+        self.stats["recovered_bytes"] += size - pos
+
+    def _file_day(self) -> str:
+        st = os.fstat(self._fd)
+        ts = st.st_mtime if st.st_size else time.time()
+        return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y%m%d")
+
+    def _reopen_if_rotated(self) -> None:
+        # Why: another worker process may have rotated the file under us
+        try:
+            current = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            current = None
+        if current != os.fstat(self._fd).st_ino:
+            os.close(self._fd)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            self._day = self._file_day()
+
+    def _maybe_rotate(self) -> None:
+        size = os.fstat(self._fd).st_size
+        today = datetime.now(timezone.utc).strftime("%Y%m%d")
+        if size == 0 or (size < self.max_bytes and not (self.rotate_daily and today != self._day)):
+            return
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        rotated = self.dir / f"{self.path.stem}-{stamp}.jsonl"
+        os.rename(self.path, rotated)
+        old = self._fd
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        os.close(old)
+        self._day = today
+        self.stats["rotations"] += 1
+        if self.compress:
+            threading.Thread(target=_gzip_segment, args=(rotated,), name="lead-journal-gzip", daemon=True).start()
+
+def _fsync_path(path: Path) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _gzip_segment(path: Path) -> None:
+    tmp = path.with_name(path.name + ".gz.tmp")
+    try:
+        with open(path, "rb") as src, open(tmp, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb") as dst:
+                shutil.copyfileobj(src, dst)
+            # Why: the gzip trailer (CRC, size) is only written on close; fsync after it, not before
+            raw.flush()
+            os.fsync(raw.fileno())
+        _fsync_path(path.parent)
+        os.replace(tmp, path.with_name(path.name + ".gz"))
+        _fsync_path(path.parent)  # Why: the .gz name must be durable before the plain copy goes
+        os.unlink(path)
+    except OSError:
+        tmp.unlink(missing_ok=True)  # Why: the plain segment stays readable
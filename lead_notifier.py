@@ -0,0 +1,179 @@
+"""Background lead notification worker for app.py.
+
+``/lead`` hands each stored lead to :class:`LeadNotifier` and returns straight
+away. One worker thread drains a bounded queue over a single long-lived SMTP
+session, reconnecting when the relay drops it, and folds bursts into one digest
+email once the queue is deep.
+"""
+from __future__ import annotations
+import os, queue, random, smtplib, threading, time
+from email.message import EmailMessage
+from instrumentation import span
+
+LEAD_FIELDS = ("name", "email", "business", "plan", "goal", "page", "ts")
+
+def format_lead(payload: dict) -> str:
+    return "\n".join([f"{k}: {payload.get(k,'')}" for k in LEAD_FIELDS])
+
+class LeadNotifier:
+    def __init__(self, host: str, to_addr: str, port: int = 587, user: str = "", pwd: str = "",
+                 from_addr: str = "", starttls: bool = True, maxsize: int = 1000,
+                 digest_threshold: int = 5, digest_max: int = 50, max_retries: int = 5,
+                 backoff: float = 1.0, idle_timeout: float = 120.0, timeout: float = 10.0):
+        self.host, self.port, self.user, self.pwd = host, port, user, pwd
+        self.to_addr = to_addr
+        self.from_addr = from_addr or to_addr
+        self.starttls = starttls
+        self.digest_threshold = digest_threshold
+        self.digest_max = digest_max
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self.stats = {"sent": 0, "digests": 0, "failed": 0, "dropped": 0, "retries": 0, "reconnects": 0}
+        self.last_error = ""
+        self._smtp: smtplib.SMTP | None = None
+        self._last_used = 0.0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @classmethod
+    def from_env(cls) -> "LeadNotifier | None":
+        host = os.getenv("SMTP_HOST", "")
+        to_addr = os.getenv("SMTP_TO", "")
+        if not (host and to_addr):
+            return None
+        return cls(
+            host, to_addr,
+            port=int(os.getenv("SMTP_PORT", "587")),
+            user=os.getenv("SMTP_USER", ""),
+            pwd=os.getenv("SMTP_PASS", ""),
+            from_addr=os.getenv("SMTP_FROM", to_addr),
+            starttls=os.getenv("SMTP_STARTTLS", "1") != "0",
+            maxsize=int(os.getenv("LEAD_NOTIFY_QUEUE", "1000")),
+            digest_threshold=int(os.getenv("LEAD_NOTIFY_DIGEST_AT", "5")),
+        )
+
+    # -- producer side -------------------------------------------------------
+
+    def submit(self, payload: dict) -> bool:
+        """Queue a lead for notification; False (and counted) if the queue is full."""
+        try:
+            self.queue.put_nowait(dict(payload))
+            return True
+        except queue.Full:
+            self.stats["dropped"] += 1
+            return False
+
+    def metrics(self) -> dict:
+        return {**self.stats, "queue_depth": self.queue.qsize(), "queue_max": self.queue.maxsize,
+                "connected": self._smtp is not None, "last_error": self.last_error}
+
+    def start(self) -> "LeadNotifier":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="lead-notifier", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Drain what is queued (within ``timeout``) and close the session."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._close()
+
+    # -- worker side ---------------------------------------------------------
+
+    def _run(self) -> None:
+        while not (self._stop.is_set() and self.queue.empty()):
+            try:
+                first = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                if self._smtp is not None and time.monotonic() - self._last_used > self.idle_timeout:
+                    self._close()
+                continue
+            batch = [first]
+            # Why: a deep queue means a burst; one digest beats N handshakes-worth of sends
+            while len(batch) < self.digest_max:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if len(batch) >= self.digest_threshold:
+                messages = [self._digest(batch)]
+                self.stats["digests"] += 1
+            else:
+                messages = [self._message(p) for p in batch]
+            for msg in messages:
+                self._deliver(msg)
+            for _ in batch:
+                self.queue.task_done()
+
+    def _message(self, payload: dict) -> EmailMessage:
+        msg = EmailMessage()
+        msg["Subject"] = f"New Lead: {payload.get('name','')} ({payload.get('plan') or 'undecided'})"
+        msg["From"] = self.from_addr
+        msg["To"] = self.to_addr
+        msg.set_content(format_lead(payload))
+        return msg
+
+    def _digest(self, batch: list) -> EmailMessage:
+        msg = EmailMessage()
+        msg["Subject"] = f"{len(batch)} New Leads"
+        msg["From"] = self.from_addr
+        msg["To"] = self.to_addr
+        msg.set_content("\n\n---\n\n".join(format_lead(p) for p in batch))
+        return msg
+
+    def _connect(self) -> smtplib.SMTP:
+        if self._smtp is not None:
+            if time.monotonic() - self._last_used < 5:
+                return self._smtp
+            try:
+                self._smtp.noop()  # Why: relays silently drop idle sessions
+                return self._smtp
+            except (smtplib.SMTPException, OSError):
+                self._close()
+        s = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                s.starttls()
+            if self.user and self.pwd:
+                s.login(self.user, self.pwd)
+        except Exception:
+            s.close()
+            raise
+        self._smtp = s
+        self.stats["reconnects"] += 1
+        return s
+
+    def _close(self) -> None:
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
+    def _deliver(self, msg: EmailMessage) -> bool:
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                with span("email_send"):
+                    self._connect().send_message(msg)
+                self._last_used = time.monotonic()
+                self.stats["sent"] += 1
+                return True
+            except (smtplib.SMTPException, OSError) as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                self._close()
+                if attempt == self.max_retries:
+                    break
+                self.stats["retries"] += 1
+                # Why: full jitter keeps several instances from hammering a recovering relay together
+                delay = random.uniform(0, self.backoff * 2 ** (attempt - 1))
+                if self._stop.wait(delay) and attempt >= 2:
+                    break  # Why: shutting down, don't hold exit hostage to a dead relay
+        self.stats["failed"] += 1
+        return False
@@ -0,0 +1,445 @@
+"""Indexed, incrementally refreshed view over the lead history.
+
+Sources are the Python journal (``data/leads.jsonl`` plus its rotated
+segments, see :mod:`lead_journal`) and the Node side's ``data/leads.json``.
+The journal is tailed by byte offset, so a refresh only parses bytes appended
+since the last one; ``leads.json`` is a single document and is re-read only
+when its size or mtime changes.
+
+Every record gets a sort key ``(ts, part, seq)``. Secondary indexes map email,
+plan, source and status to key lists kept in ascending order, which makes
+equality lookups O(1), timestamp ranges and cursor seeks O(log n), and a page
+O(limit) on top. Journal records themselves are not held: each key maps to a
+``(segment, byte offset)`` location and a page reads its lines back from disk.
+Keys, postings and locations are pickled to ``data/.leads.idx`` so a restart
+resumes from the saved offsets instead of re-parsing the history.
+
+``lead_export.py compact`` copies ``leads.json`` into a journal segment but
+leaves the file in place, so a journal record whose ``id`` is also in
+``leads.json`` is skipped; the Node copy is the live one.
+"""
+from __future__ import annotations
+import base64, gzip, hashlib, json, os, pickle, threading, time
+from datetime import datetime, timezone
+from bisect import bisect_left, bisect_right, insort
+from pathlib import Path
+
+INDEX_VERSION = 3
+INDEXED_FIELDS = ("email", "plan", "source", "status")
+JOURNAL, NODE = 0, 1
+
+def normalize_email(email) -> str:
+    return str(email or "").strip().lower()
+
+def _norm(field: str, value) -> str:
+    return normalize_email(value) if field == "email" else str(value or "").strip().lower()
+
+def record_ts(record: dict) -> str:
+    return str(record.get("ts") or record.get("createdAt") or "")
+
+def parse_ts(ts: str) -> float:
+    """Epoch seconds for an ISO timestamp (naive means UTC); 0.0 if unparseable."""
+    try:
+        dt = datetime.fromisoformat(str(ts).replace("Z", "+00:00"))
+    except ValueError:
+        return 0.0
+    return (dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)).timestamp()
+
+def encode_cursor(key: tuple) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple:
+    """The (ts, part, seq) key in ``cursor``; ValueError for anything we didn't issue."""
+    try:
+        ts, part, seq = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError, RecursionError) as exc:
+        raise ValueError("bad cursor") from exc
+    # Why: exact types only; int(1e999) overflows and int(True) would quietly page from the wrong source
+    if type(ts) is not str or type(part) is not int or type(seq) is not int:
+        raise ValueError("bad cursor")
+    return (ts, part, seq)
+
+class _Stale(Exception):
+    """A stored location no longer holds the record it was indexed from."""
+
+class _Index:
+    """Sorted keys and secondary indexes for one source.
+
+    Journal records are not kept: ``locs`` maps each key to ``(segment id,
+    byte offset)`` and the line is read back when a page needs it. The Node
+    source is small and re-read whole, so its ``records`` are held as parsed.
+    """
+
+    def __init__(self, part: int):
+        self.part = part
+        self.seq = 0
+        self.records: dict = {}
+        self.locs: dict = {}
+        self.keys: list = []
+        self.postings: dict = {f: {} for f in INDEXED_FIELDS}
+        self.ids: dict = {}  # lead id -> keys carrying it
+
+    def add(self, record: dict, loc: tuple | None = None) -> tuple:
+        key = (record_ts(record), self.part, self.seq)
+        self.seq += 1
+        if loc is None:
+            self.records[key] = record
+        else:
+            self.locs[key] = loc
+        if record.get("id"):
+            self.ids.setdefault(str(record["id"]), []).append(key)
+        # Why: journal order is almost always ts order, so insort appends at the tail
+        insort(self.keys, key)
+        for f in INDEXED_FIELDS:
+            value = _norm(f, record.get(f))
+            if value:
+                insort(self.postings[f].setdefault(value, []), key)
+        return key
+
+    def _posted(self, field: str, value: str, key: tuple) -> bool:
+        keys = self.postings[field][value]
+        i = bisect_left(keys, key)
+        return i < len(keys) and keys[i] == key
+
+    def scan(self, filters: dict, since: str, until: str, before: tuple | None):
+        """Yield keys newest first matching ``filters`` within [since, until] and below ``before``."""
+        candidates = self.keys
+        if filters:
+            lists = []
+            for f, v in filters.items():
+                hit = self.postings[f].get(v)
+                if not hit:
+                    return
+                lists.append((len(hit), f, hit))
+            _, shortest, candidates = min(lists)
+            others = [(f, v) for f, v in filters.items() if f != shortest]
+        lo = bisect_left(candidates, (since,)) if since else 0
+        hi = bisect_right(candidates, (until + "\uffff",)) if until else len(candidates)
+        if before is not None:
+            hi = min(hi, bisect_left(candidates, before))
+        for i in range(hi - 1, lo - 1, -1):
+            key = candidates[i]
+            if not filters or all(self._posted(f, v, key) for f, v in others):
+                yield key
+
+class LeadStore:
+    def __init__(self, data_dir: Path, journal_name: str = "leads.jsonl", json_name: str = "leads.json",
+                 index_name: str = ".leads.idx", save_every: int = 1000):
+        self.dir = Path(data_dir)
+        self.journal_path = self.dir / journal_name
+        self.json_path = self.dir / json_name
+        self.index_path = self.dir / index_name
+        self.save_every = save_every
+        self._lock = threading.RLock()
+        self._reset()
+        self._load_snapshot()
+
+    def _reset(self) -> None:
+        self.journal = _Index(JOURNAL)
+        self.node = _Index(NODE)
+        self.segments: list = []          # segment id -> rotated name without ".gz"; None while it is the active file
+        self.active_seg = -1              # segment id of the active journal file
+        self.segments_done: set = set()   # rotated segment names, without ".gz"
+        self.seen: dict = {}              # digest of an indexed journal line -> its key
+        self.active = (0, 0)              # (inode, offset) into the active journal file
+        self.json_sig = None
+        self._node_version = 0
+        self._shadow = (None, set())      # ((journal seq, node version), shadowed journal keys)
+        self._dirty = 0
+
+    # -- persistence ---------------------------------------------------------
+
+    def _load_snapshot(self) -> None:
+        try:
+            with open(self.index_path, "rb") as f:
+                state = pickle.load(f)
+            if state.get("version") != INDEX_VERSION:
+                return
+        except Exception:  # Why: any unreadable snapshot just means a full rebuild
+            return
+        self.journal = state["journal"]
+        self.segments = state["segments"]
+        self.active_seg = state["active_seg"]
+        self.segments_done = state["segments_done"]
+        self.seen = state["seen"]
+        self.active = state["active"]
+        # Why: leads.json is cheap to re-read and may have changed while we were down
+
+    def save(self) -> None:
+        with self._lock:
+            state = {"version": INDEX_VERSION, "journal": self.journal, "segments": self.segments,
+                     "active_seg": self.active_seg, "segments_done": self.segments_done,
+                     "seen": self.seen, "active": self.active}
+            tmp = self.index_path.with_name(self.index_path.name + ".tmp")
+            try:
+                with open(tmp, "wb") as f:
+                    pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, self.index_path)
+                self._dirty = 0
+            except OSError:
+                pass  # Why: the index is a cache; the journal is the source of truth
+
+    # -- ingestion -----------------------------------------------------------
+
+    def refresh(self) -> None:
+        with self._lock:
+            self._refresh_journal()
+            self._refresh_json()
+            if self._dirty >= self.save_every:
+                self.save()
+
+    def rebuild(self) -> None:
+        """Drop the in-memory index and re-read every source."""
+        with self._lock:
+            self._reset()
+            self.refresh()
+
+    def _ingest_line(self, raw: bytes, seg: int, offset: int) -> None:
+        digest = hashlib.blake2b(raw, digest_size=8).digest()
+        key = self.seen.get(digest)
+        if key is not None:
+            # Why: the same bytes, now in a rotated or gzipped segment; point there
+            self.journal.locs[key] = (seg, offset)
+            return
+        try:
+            record = json.loads(raw)
+        except ValueError:
+            return
+        if isinstance(record, dict):
+            self.seen[digest] = self.journal.add(record, (seg, offset))
+            self._dirty += 1
+
+    def _new_segment(self, name) -> int:
+        self.segments.append(name)
+        return len(self.segments) - 1
+
+    def _read_from(self, path: Path, offset: int, seg: int) -> int:
+        """Index complete lines of a plain segment from ``offset``; returns the new offset."""
+        with open(path, "rb") as f:
+            f.seek(offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # Why: writer mid-append; pick it up next refresh
+                self._ingest_line(raw, seg, offset)
+                offset += len(raw)
+        return offset
+
+    def _refresh_journal(self) -> None:
+        try:
+            st = os.stat(self.journal_path)
+            inode, size = st.st_ino, st.st_size
+        except FileNotFoundError:
+            inode, size = 0, 0
+        if inode == self.active[0] and size == self.active[1]:
+            return  # Why: hot path, one stat and nothing new
+        if inode and inode == self.active[0] and size < self.active[1]:
+            # Why: truncated in place means lead_export compacted; every stored location is gone
+            node_sig, node = self.json_sig, self.node
+            self._reset()
+            self.json_sig, self.node = node_sig, node
+        if inode != self.active[0] or size < self.active[1]:
+            self._refresh_rotated()
+            self.active = (inode, 0)
+            self.active_seg = self._new_segment(None)
+        if inode:
+            self.active = (inode, self._read_from(self.journal_path, self.active[1], self.active_seg))
+
+    def _refresh_rotated(self) -> None:
+        stem = self.journal_path.stem
+        names = sorted(p.name for p in self.dir.glob(stem + "-*.jsonl*") if p.name.endswith((".jsonl", ".jsonl.gz")))
+        for name in names:
+            base = name[:-3] if name.endswith(".gz") else name
+            if base in self.segments_done or (name.endswith(".jsonl") and name + ".gz" in names):
+                continue
+            path = self.dir / name
+            if name.endswith(".jsonl") and self.active_seg >= 0 and os.stat(path).st_ino == self.active[0]:
+                # the file we were tailing, now rotated: its lines keep their segment id, which gets a name
+                self._read_from(path, self.active[1], self.active_seg)
+                self.segments[self.active_seg] = base
+            else:
+                seg = self._new_segment(base)
+                opener = open if name.endswith(".jsonl") else gzip.open
+                offset = 0
+                with opener(path, "rb") as f:
+                    for raw in f:
+                        if raw.endswith(b"\n"):
+                            self._ingest_line(raw, seg, offset)
+                        offset += len(raw)
+            self.segments_done.add(base)
+
+    def _refresh_json(self) -> None:
+        try:
+            st = os.stat(self.json_path)
+            sig = (st.st_size, st.st_mtime_ns)
+        except FileNotFoundError:
+            sig = None
+        if sig == self.json_sig:
+            return
+        self.json_sig = sig
+        node = _Index(NODE)
+        if sig is not None:
+            try:
+                with open(self.json_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                data = {}
+            for rec in (data.get("leads", []) if isinstance(data, dict) else data):
+                if isinstance(rec, dict):
+                    node.add(rec)
+        self.node = node
+        self._node_version += 1
+
+    # -- record access -------------------------------------------------------
+
+    def _segment_path(self, seg: int) -> Path:
+        name = self.segments[seg]
+        if name is None:
+            return self.journal_path
+        plain = self.dir / name
+        return plain if plain.exists() else self.dir / (name + ".gz")
+
+    def _load(self, keys: list) -> list:
+        """Records for ``keys``, journal lines read back from disk, one open per segment."""
+        out, by_seg = {}, {}
+        for k in keys:
+            if k[1] == JOURNAL:
+                seg, offset = self.journal.locs[k]
+                by_seg.setdefault(seg, []).append((offset, k))
+            else:
+                out[k] = self.node.records[k]
+        for seg, wanted in by_seg.items():
+            path = self._segment_path(seg)
+            try:
+                with (gzip.open if path.suffix == ".gz" else open)(path, "rb") as f:
+                    for offset, k in sorted(wanted):
+                        f.seek(offset)  # Why: ascending, so a gzip segment is decompressed at most once
+                        raw = f.readline()
+                        # Why: a rotation or compaction since the refresh can leave other bytes at this offset
+                        if self.seen.get(hashlib.blake2b(raw, digest_size=8).digest()) != k:
+                            raise _Stale(path)
+                        out[k] = json.loads(raw)
+            except (OSError, EOFError) as exc:
+                raise _Stale(path) from exc
+        return [out[k] for k in keys]
+
+    def _read(self, pick) -> list:
+        """``pick()`` returns keys under the lock; their records, rebuilding once if a location went stale."""
+        with self._lock:
+            self.refresh()
+            try:
+                return self._load(pick())
+            except _Stale:
+                self.rebuild()
+                return self._load(pick())
+
+    def _shadowed(self) -> set:
+        """Journal keys of leads that ``leads.json`` still holds; the Node copy is the live one."""
+        stamp = (self.journal.seq, self._node_version)
+        if self._shadow[0] != stamp:
+            ids = self.journal.ids.keys() & self.node.ids.keys()
+            self._shadow = (stamp, {k for rid in ids for k in self.journal.ids[rid]})
+        return self._shadow[1]
+
+    # -- queries -------------------------------------------------------------
+
+    def query(self, filters: dict | None = None, since: str = "", until: str = "",
+              cursor: str | None = None, limit: int = 50) -> dict:
+        """Newest-first page of leads; ``next_cursor`` is None on the last page."""
+        filters = {f: _norm(f, v) for f, v in (filters or {}).items() if f in INDEXED_FIELDS and v}
+        before = decode_cursor(cursor) if cursor else None
+        keys = []
+
+        def pick():
+            shadowed = self._shadowed()
+            streams = [(k for k in self.journal.scan(filters, since, until, before) if k not in shadowed),
+                       self.node.scan(filters, since, until, before)]
+            keys[:] = []
+            heads = [next(s, None) for s in streams]
+            while len(keys) < limit + 1 and any(h is not None for h in heads):
+                i = max((i for i, h in enumerate(heads) if h is not None), key=lambda i: heads[i])
+                keys.append(heads[i])
+                heads[i] = next(streams[i], None)
+            return keys[:limit]
+
+        leads = self._read(pick)
+        return {"leads": leads, "next_cursor": encode_cursor(keys[limit - 1]) if len(keys) > limit else None}
+
+    def find_by_email(self, email: str) -> list:
+        email = normalize_email(email)
+
+        def pick():
+            shadowed = self._shadowed()
+            return ([k for k in self.journal.postings["email"].get(email, []) if k not in shadowed]
+                    + self.node.postings["email"].get(email, []))
+
+        return self._read(pick)
+
+    def last_seen(self, email: str, until: str = "") -> str:
+        """Newest timestamp recorded for ``email`` across both sources, at or before ``until`` if given, or ""."""
+        email = normalize_email(email)
+        latest = []
+        with self._lock:
+            self.refresh()
+            for idx in (self.journal, self.node):
+                keys = idx.postings["email"].get(email)
+                if keys:
+                    i = bisect_right(keys, (until + "\uffff",)) if until else len(keys)
+                    if i:
+                        latest.append(keys[i - 1][0])
+        return max(latest, default="")
+
+    def count(self) -> int:
+        with self._lock:
+            self.refresh()
+            return len(self.journal.keys) + len(self.node.keys) - len(self._shadowed())
+
+class LeadDeduper:
+    """Ingest-time duplicate check on normalized email within ``window`` seconds.
+
+    A dict of email -> last accepted time answers repeats from this process in
+    O(1). On a miss it asks the :class:`LeadStore`, whose tail of the journal
+    also covers leads taken by other worker processes. Entries older than the
+    window are pruned as the dict grows, so memory tracks recent traffic rather
+    than the whole history.
+    """
+
+    def __init__(self, store: LeadStore, window: float):
+        self.store = store
+        self.window = window
+        self.stats = {"duplicates": 0, "accepted": 0}
+        self._recent: dict = {}
+        self._prune_at = 1024
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, store: LeadStore) -> "LeadDeduper":
+        return cls(store, float(os.getenv("LEAD_DEDUPE_WINDOW", "86400")))
+
+    def claim(self, email: str) -> bool:
+        """True if ``email`` is new within the window; it is then marked as seen."""
+        if self.window <= 0:
+            return True
+        email = normalize_email(email)
+        now = time.time()
+        with self._lock:
+            last = self._recent.get(email)
+            if last is None:
+                # Why: records older than the server-stamped ts may carry a client clock; never trust a future one
+                stamp = datetime.fromtimestamp(now, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+                last = parse_ts(self.store.last_seen(email, until=stamp)) or None
+            if last is not None and now - last < self.window:
+                self._recent[email] = last
+                self.stats["duplicates"] += 1
+                return False
+            self._recent[email] = now
+            self.stats["accepted"] += 1
+            if len(self._recent) >= self._prune_at:
+                cutoff = now - self.window
+                self._recent = {e: t for e, t in self._recent.items() if t >= cutoff}
+                self._prune_at = max(1024, 2 * len(self._recent))
+        return True
+
+    def release(self, email: str) -> None:
+        """Undo a claim whose write failed, so a retry is not treated as a duplicate."""
+        with self._lock:
+            self._recent.pop(normalize_email(email), None)
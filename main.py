@@ -1,6 +1,19 @@
 from flask import Flask, request, jsonify
-import os
+import atexit, os
+from pathlib import Path
+from sync_queue import SyncQueue
+from instrumentation import instrument_flask, metrics
+
 app = Flask(__name__)
+instrument_flask(app)
+
+def deploy(data: dict) -> None:
+    print("[SFS] Deploy", data)
+
+# Why: ack the webhook immediately; bursts for one repo/ref collapse into one deploy of the newest sha
+deploys = SyncQueue.from_env(deploy, Path(os.getenv("DEPLOY_QUEUE_SPILL", Path(__file__).parent / "state" / "deploy-queue.jsonl")))
+atexit.register(deploys.stop)
+metrics.collect(lambda: deploys.samples("deploy_queue"))
 
 @app.get("/health")
 def health():
@@ -11,5 +24,7 @@ def gh_sync():
     if request.headers.get("Authorization","") != f"Bearer {os.environ.get('REPLIT_TOKEN','')}":
         return ("nope", 401)
     data = request.get_json(silent=True) or {}
-    print("[SFS] Deploy", data)
-    return jsonify(status="ok")
\ No newline at end of file
+    queued = deploys.submit(data, request.headers.get("X-GitHub-Delivery", ""))
+    if queued in ("full", "closed"):
+        return jsonify(status="busy"), 503
+    return jsonify(status="ok", queue=queued), 202
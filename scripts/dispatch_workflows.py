@@ -1,9 +1,14 @@
 #!/usr/bin/env python3
-import argparse, os, sys, time, json
-from typing import Dict, Any, List
+import argparse, os, sys, time, json, random, threading
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, List, Optional
+from urllib.parse import urlsplit
 import requests
+from requests.adapters import HTTPAdapter
 
-API = "https://api.github.com"
+API = os.getenv("GITHUB_API_URL", "https://api.github.com")
+RETRYABLE = {429, 500, 502, 503, 504}
 
 def fatal(msg: str, code: int = 1) -> None:
     print(f"❌ {msg}", file=sys.stderr); sys.exit(code)
@@ -22,19 +27,119 @@ def load_matrix(path: str) -> List[Dict[str, str]]:
     except Exception as e:
         fatal(f"failed to read {path}: {e}")
 
-def dispatch(owner: str, repo: str, ref: str, wf: str, token: str, inputs: Dict[str, Any], tries: int = 3, delay: float = 0.8) -> bool:
-    url = f"{API}/repos/{owner}/{repo}/actions/workflows/{wf}/dispatches"
+def make_session(pool: int = 10) -> requests.Session:
+    """One keep-alive session shared by every worker."""
+    s = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(pool, 1))
+    s.mount("https://", adapter); s.mount("http://", adapter)
+    return s
+
+class RateGate:
+    """Per-host concurrency caps plus a shared pause when GitHub says we're out of quota."""
+
+    def __init__(self, per_host: int):
+        self.per_host = max(per_host, 1)
+        self._sems: Dict[str, threading.BoundedSemaphore] = {}
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def slot(self, url: str) -> threading.BoundedSemaphore:
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._sems:
+                self._sems[host] = threading.BoundedSemaphore(self.per_host)
+            return self._sems[host]
+
+    def pause_until(self, ts: float) -> None:
+        with self._lock:
+            self._resume_at = max(self._resume_at, ts)
+
+    def wait(self) -> None:
+        delay = self._resume_at - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+def retry_after(r: requests.Response, max_wait: float) -> Optional[float]:
+    """Seconds GitHub asked us to wait (Retry-After or exhausted X-RateLimit), if any."""
+    ra = r.headers.get("Retry-After")
+    if ra:
+        try:
+            wait = float(ra)
+        except ValueError:
+            try:
+                wait = parsedate_to_datetime(ra).timestamp() - time.time()
+            except (TypeError, ValueError):
+                wait = None
+        if wait is not None:
+            return min(max(wait, 0.0), max_wait)
+    if r.headers.get("X-RateLimit-Remaining") == "0":
+        try:
+            return min(max(float(r.headers.get("X-RateLimit-Reset", "0")) - time.time(), 0.0), max_wait)
+        except ValueError:
+            return max_wait
+    return None
+
+def dispatch_one(owner: str, repo: str, ref: str, wf: str, token: str, inputs: Dict[str, Any], tries: int = 3,
+                 delay: float = 0.8, session: Optional[requests.Session] = None, api: str = API,
+                 gate: Optional[RateGate] = None, max_wait: float = 60.0) -> Dict[str, Any]:
+    url = f"{api}/repos/{owner}/{repo}/actions/workflows/{wf}/dispatches"
     headers = {"Authorization": f"Bearer {token}", "Accept": "application/vnd.github+json"}
     payload: Dict[str, Any] = {"ref": ref}
     if inputs: payload["inputs"] = inputs
+    http = session or requests
+    gate = gate or RateGate(1)
+    result: Dict[str, Any] = {"repo": f"{owner}/{repo}", "ref": ref, "workflow": wf, "ok": False, "status": None, "tries": 0}
+    started = time.perf_counter()
     for i in range(1, tries+1):
-        r = requests.post(url, headers=headers, json=payload, timeout=20)
-        if r.status_code == 204:
-            print(f"✅ Dispatched {owner}/{repo}:{ref} → {wf} (try {i})")
-            return True
-        print(f"⚠️  {owner}/{repo}:{ref} → {wf} failed (try {i}) [{r.status_code}] {r.text.strip()}")
-        time.sleep(delay*i)
-    return False
+        gate.wait()
+        result["tries"] = i
+        wait: Optional[float] = None
+        try:
+            with gate.slot(url):
+                r = http.post(url, headers=headers, json=payload, timeout=20)
+        except requests.RequestException as e:
+            result["status"] = type(e).__name__
+            print(f"⚠️  {owner}/{repo}:{ref} → {wf} failed (try {i}) [{type(e).__name__}] {e}")
+        else:
+            result["status"] = r.status_code
+            if r.status_code == 204:
+                print(f"✅ Dispatched {owner}/{repo}:{ref} → {wf} (try {i})")
+                result["ok"] = True
+                break
+            print(f"⚠️  {owner}/{repo}:{ref} → {wf} failed (try {i}) [{r.status_code}] {r.text.strip()}")
+            wait = retry_after(r, max_wait)
+            if wait is not None:
+                gate.pause_until(time.time() + wait)  # Why: quota is per token, so every worker backs off
+            elif r.status_code not in RETRYABLE:
+                break  # Why: 404/422 etc. won't fix themselves
+        if i < tries:
+            # Why: full jitter so a fleet of retries doesn't land on the same second
+            time.sleep(wait if wait is not None else random.uniform(0, delay * 2 ** (i - 1)))
+    result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+def dispatch(owner: str, repo: str, ref: str, wf: str, token: str, inputs: Dict[str, Any], tries: int = 3, delay: float = 0.8,
+             session: Optional[requests.Session] = None, api: str = API) -> bool:
+    return dispatch_one(owner, repo, ref, wf, token, inputs, tries, delay, session=session, api=api)["ok"]
+
+def dispatch_all(rows: List[Dict[str, str]], token: str, inputs: Dict[str, Any], concurrency: int = 8, per_host: int = 8,
+                 tries: int = 3, delay: float = 0.8, api: str = API, max_wait: float = 60.0) -> List[Dict[str, Any]]:
+    session = make_session(concurrency)
+    gate = RateGate(per_host)
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1), thread_name_prefix="dispatch") as pool:
+        futures = [pool.submit(dispatch_one, r["owner"], r["repo"], r.get("ref", "main"), r.get("workflow", "ci.yml"),
+                               token, inputs, tries, delay, session, api, gate, max_wait) for r in rows]
+        return [f.result() for f in futures]
+
+def print_summary(results: List[Dict[str, Any]], elapsed: float) -> None:
+    if not results: return
+    w = max(len(f"{r['repo']}:{r['ref']} → {r['workflow']}") for r in results)
+    print(f"\n{'target'.ljust(w)}  {'result':<6}  {'status':<6}  {'tries':>5}  {'latency':>10}")
+    for r in sorted(results, key=lambda r: -r["latency_ms"]):
+        target = f"{r['repo']}:{r['ref']} → {r['workflow']}"
+        print(f"{target.ljust(w)}  {('ok' if r['ok'] else 'FAIL'):<6}  {str(r['status']):<6}  {r['tries']:>5}  {r['latency_ms']:>8.1f}ms")
+    ok = sum(r["ok"] for r in results)
+    print(f"\n{ok}/{len(results)} dispatched in {elapsed:.2f}s")
 
 def main() -> None:
     p = argparse.ArgumentParser()
@@ -42,6 +147,11 @@ def main() -> None:
     p.add_argument("--only", nargs="*", help="Repo name(s) to include")
     p.add_argument("--inputs", nargs="*", default=[], help="key=value pairs")
     p.add_argument("--all", action="store_true")
+    p.add_argument("--concurrency", type=int, default=8, help="parallel dispatches (1 = sequential)")
+    p.add_argument("--per-host", type=int, default=8, help="max in-flight requests per API host")
+    p.add_argument("--tries", type=int, default=3)
+    p.add_argument("--max-wait", type=float, default=60.0, help="cap on Retry-After / rate-limit sleeps (s)")
+    p.add_argument("--api", default=API, help="API base URL, e.g. a local stub")
     args = p.parse_args()
 
     token = os.getenv("GITHUB_TOKEN") or os.getenv("GH_TOKEN")
@@ -62,14 +172,18 @@ def main() -> None:
     if not args.all and not args.only:
         fatal("nothing to do. Use --all or --only <repo>")
 
-    ok = True
+    rows = []
     for r in repos:
-        owner=r.get("owner"); repo=r.get("repo"); ref=r.get("ref","main"); wf=r.get("workflow","ci.yml")
-        if not all([owner,repo,wf]):
+        if not all([r.get("owner"), r.get("repo"), r.get("workflow", "ci.yml")]):
             print(f"⏭️  skip invalid row: {r}")
             continue
-        if not dispatch(owner, repo, ref, wf, token, inputs): ok=False
-    sys.exit(0 if ok else 2)
+        rows.append(r)
+
+    started = time.perf_counter()
+    results = dispatch_all(rows, token, inputs, concurrency=args.concurrency, per_host=args.per_host,
+                           tries=args.tries, api=args.api.rstrip("/"), max_wait=args.max_wait)
+    print_summary(results, time.perf_counter() - started)
+    sys.exit(0 if all(r["ok"] for r in results) else 2)
 
 if __name__ == "__main__":
     main()
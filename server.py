@@ -1,16 +1,41 @@
 from flask import Flask, request, jsonify
+import atexit, os
+from pathlib import Path
+from sync_queue import SyncQueue
+from instrumentation import instrument_flask, metrics
+
+BASE = Path(__file__).parent.resolve()
 app = Flask(__name__)
+instrument_flask(app)
+
+def handle_sync(payload: dict) -> None:
+    print("🔔 gh-sync:", {k: payload.get(k) for k in ("event","repo","sha")})
+
+# Why: a push storm is acked at once and synced once per (repo, ref), for the newest sha
+sync_queue = SyncQueue.from_env(handle_sync, Path(os.getenv("GH_SYNC_SPILL", BASE / "state" / "gh-sync-queue.jsonl")))
+atexit.register(sync_queue.stop)
+metrics.collect(sync_queue.samples)
+
+def accept_sync(payload: dict, delivery: str = "", event: str = ""):
+    """(status, body) for a gh-sync webhook; shared with asgi.py."""
+    if event:
+        payload.setdefault("event", event)
+    status = sync_queue.submit(payload, delivery)
+    if status in ("full", "closed"):
+        return 503, {"received": False, "status": status}
+    return 202, {"received": True, "status": status}
 
 @app.get("/health")
 def health():
+    # Security: unauthenticated; queue depth and failure counts are on /metrics (sync_queue_*) only
     return jsonify(ok=True), 200
 
 @app.post("/api/gh-sync")
 def gh_sync():
     payload = request.get_json(silent=True) or {}
-    print("🔔 gh-sync:", {k: payload.get(k) for k in ("event","repo","sha")})
-    return jsonify(received=True), 200
+    code, body = accept_sync(payload, request.headers.get("X-GitHub-Delivery", ""),
+                             request.headers.get("X-GitHub-Event", ""))
+    return jsonify(body), code
 
 if __name__ == "__main__":
-    import os
-    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)))
\ No newline at end of file
+    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)))
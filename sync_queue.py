@@ -0,0 +1,311 @@
+"""Coalescing intake queue for gh-sync deploy webhooks.
+
+``submit`` acks in O(1): it records the event and returns. Events are keyed by
+``(repo, ref)`` and debounced, so a push storm to one branch runs the handler
+once, for the newest sha, ``debounce`` seconds after the last push (or
+``max_delay`` after the first, whichever is sooner). Handlers run on a bounded
+thread pool and never twice at once for the same key.
+
+Repeat deliveries (same ``X-GitHub-Delivery`` id) are acknowledged and dropped.
+Every accepted event and every completed key is appended to a spill file; on
+start it is replayed, so events still queued when the process stopped are
+processed after a restart. The file is compacted on start and as it grows.
+
+Each process owns one spill file. ``spill_path`` names slot 0; a process that
+finds it flock-held by another worker takes ``<stem>.1<suffix>``, then ``.2``
+and so on, and holds that lock until :meth:`SyncQueue.stop`. On start it also
+adopts any other slot whose lock is free (a worker that is gone), so nothing a
+dead worker accepted is lost and nothing is replayed twice.
+"""
+from __future__ import annotations
+import json, os, threading, time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from instrumentation import span
+
+try:
+    import fcntl  # type: ignore
+except ImportError:  # Why: Windows dev boxes; single-process there anyway
+    fcntl = None
+
+def event_key(event: dict) -> tuple:
+    repo = event.get("repo") or (event.get("repository") or {}).get("full_name") or ""
+    return (str(repo), str(event.get("ref") or ""))
+
+class _Job:
+    __slots__ = ("key", "event", "seq", "first", "due", "attempts")
+
+    def __init__(self, key: tuple, event: dict, seq: int, now: float, due: float):
+        self.key = key
+        self.event = event
+        self.seq = seq
+        self.first = now
+        self.due = due
+        self.attempts = 0
+
+class SyncQueue:
+    def __init__(self, handler, spill_path: Path, debounce: float = 2.0, max_delay: float = 30.0,
+                 workers: int = 4, maxsize: int = 10000, dedupe_ttl: float = 86400.0,
+                 max_retries: int = 3, backoff: float = 2.0, compact_every: int = 10000,
+                 max_deliveries: int = 100000):
+        self.handler = handler
+        self.base_path = Path(spill_path)
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.maxsize = maxsize
+        self.dedupe_ttl = dedupe_ttl
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.compact_every = compact_every
+        self.max_deliveries = max_deliveries
+        self.stats = {"received": 0, "duplicates": 0, "coalesced": 0, "rejected": 0,
+                      "processed": 0, "failed": 0, "replayed": 0}
+        self._pending: dict = {}
+        self._running: dict = {}
+        self._deliveries: OrderedDict = OrderedDict()  # delivery id -> accepted at
+        self._seq = 0
+        self._spill_lines = 0
+        self._compact_at = compact_every
+        self._next_wake = 0.0
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._pool = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="gh-sync")
+        self.base_path.parent.mkdir(parents=True, exist_ok=True)
+        self._locks: dict = {}  # slot path -> flocked fd
+        self.spill_path = self._claim()
+        adopted = self._adopt()
+        self._replay([self.spill_path] + adopted)
+        for path in adopted:  # Why: their events now live in our file; drop them so no one replays them again
+            path.unlink(missing_ok=True)
+            os.close(self._locks.pop(path))
+        self._spill = open(self.spill_path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._schedule, name="gh-sync-scheduler", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_env(cls, handler, spill_path: Path) -> "SyncQueue":
+        return cls(
+            handler, spill_path,
+            debounce=float(os.getenv("GH_SYNC_DEBOUNCE", "2")),
+            max_delay=float(os.getenv("GH_SYNC_MAX_DELAY", "30")),
+            workers=int(os.getenv("GH_SYNC_WORKERS", "4")),
+            maxsize=int(os.getenv("GH_SYNC_QUEUE", "10000")),
+        )
+
+    # -- producer side -------------------------------------------------------
+
+    def submit(self, event: dict, delivery: str = "") -> str:
+        """Enqueue ``event``; returns "queued", "coalesced", "duplicate", "full" or "closed"."""
+        key = event_key(event)
+        now = time.time()
+        with self._cond:
+            self.stats["received"] += 1
+            if self._stopping:
+                self.stats["rejected"] += 1
+                return "closed"
+            if delivery and delivery in self._deliveries:
+                self.stats["duplicates"] += 1
+                return "duplicate"
+            job = self._pending.get(key)
+            if job is None and len(self._pending) >= self.maxsize:
+                self.stats["rejected"] += 1
+                return "full"
+            self._seq += 1
+            if job is None:
+                self._pending[key] = job = _Job(key, event, self._seq, now, now + self.debounce)
+                status = "queued"
+            else:
+                # Why: only the newest sha for a branch is worth deploying
+                job.event, job.seq, job.attempts = event, self._seq, 0
+                job.due = min(job.first + self.max_delay, now + self.debounce)
+                self.stats["coalesced"] += 1
+                status = "coalesced"
+            if delivery:
+                self._remember(delivery, now)
+            self._write({"op": "enq", "seq": self._seq, "key": list(key), "event": event,
+                         "delivery": delivery, "at": now})
+            if job.due < self._next_wake:  # Why: a burst of pushes doesn't wake the scheduler per event
+                self._cond.notify()
+        return status
+
+    def metrics(self) -> dict:
+        with self._cond:
+            return {**self.stats, "pending": len(self._pending), "running": len(self._running)}
+
+    def samples(self, prefix: str = "sync_queue"):
+        """Metrics as (name, kind, labels, value) tuples for :mod:`instrumentation`."""
+        for name, value in self.metrics().items():
+            if name in ("pending", "running"):
+                yield f"{prefix}_{name}", "gauge", {}, value
+            else:
+                yield f"{prefix}_{name}_total", "counter", {}, value
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Finish running handlers; still-pending events stay in the spill file."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        self._pool.shutdown(wait=True)
+        with self._cond:
+            self._spill.close()
+            for fd in self._locks.values():
+                os.close(fd)
+            self._locks.clear()
+
+    # -- scheduler / workers -------------------------------------------------
+
+    def _schedule(self) -> None:
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+                now = time.time()
+                idle = [j for k, j in self._pending.items() if k not in self._running]
+                ready = [j for j in idle if j.due <= now]
+                for job in ready:
+                    del self._pending[job.key]
+                    self._running[job.key] = job
+                if not ready:
+                    self._next_wake = min((j.due for j in idle), default=float("inf"))
+                    self._cond.wait(self._next_wake - now if idle else None)
+                    self._next_wake = 0.0
+                    continue
+            for job in ready:
+                self._pool.submit(self._work, job)
+
+    def _work(self, job: _Job) -> None:
+        try:
+            with span("sync_handler"):
+                self.handler(job.event)
+            ok = True
+        except Exception as e:  # Why: one bad deploy hook must not kill the worker
+            print(f"⚠️  gh-sync {job.key[0]}@{job.key[1]} failed (try {job.attempts + 1}): {e}")
+            ok = False
+        with self._cond:
+            del self._running[job.key]
+            if ok:
+                self.stats["processed"] += 1
+            elif job.attempts + 1 < self.max_retries and job.key not in self._pending:
+                job.attempts += 1
+                job.due = time.time() + self.backoff * 2 ** (job.attempts - 1)
+                self._pending[job.key] = job
+                self._cond.notify()
+                return
+            else:
+                self.stats["failed"] += 1
+            self._write({"op": "done", "key": list(job.key), "seq": job.seq})
+            self._cond.notify()
+
+    # -- spill file ----------------------------------------------------------
+
+    def _remember(self, delivery: str, at: float) -> None:
+        self._deliveries[delivery] = at
+        cutoff = time.time() - self.dedupe_ttl
+        while self._deliveries:
+            ts = next(iter(self._deliveries.values()))
+            if ts >= cutoff and len(self._deliveries) <= self.max_deliveries:
+                break
+            self._deliveries.popitem(last=False)
+
+    def _write(self, entry: dict) -> None:
+        if self._spill.closed:
+            return
+        try:
+            self._spill.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._spill.flush()
+        except OSError as e:
+            print(f"⚠️  gh-sync spill write failed: {e}")
+            return
+        self._spill_lines += 1
+        if self._spill_lines >= self._compact_at:
+            self._compact()
+
+    def _slot(self, n: int) -> Path:
+        base = self.base_path
+        return base if n == 0 else base.with_name(f"{base.stem}.{n}{base.suffix}")
+
+    def _try_lock(self, path: Path) -> bool:
+        if fcntl is None:
+            return True
+        fd = os.open(path.with_name(path.name + ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._locks[path] = fd
+        return True
+
+    def _claim(self) -> Path:
+        """Lock the lowest free slot; every worker process gets a spill file of its own."""
+        n = 0
+        while not self._try_lock(self._slot(n)):
+            n += 1
+        return self._slot(n)
+
+    def _adopt(self) -> list:
+        """Slots left behind by workers that are gone, locked so we can take their events over."""
+        if fcntl is None:
+            return []
+        base = self.base_path
+        slots = [base] + sorted(p for p in base.parent.glob(f"{base.stem}.*{base.suffix}")
+                                if p.name[len(base.stem) + 1:-len(base.suffix) or None].isdigit())
+        return [p for p in slots if p != self.spill_path and p.exists() and self._try_lock(p)]
+
+    def _replay(self, paths: list) -> None:
+        jobs, seen = {}, []  # key -> (at, event); (at, delivery)
+        for path in paths:
+            enqueued, done = {}, {}
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                            key = tuple(entry["key"]) if "key" in entry else None
+                        except (ValueError, KeyError, TypeError):
+                            continue  # Why: torn last line after a crash
+                        op = entry.get("op")
+                        if op == "enq":
+                            enqueued[key] = entry
+                        elif op == "done":
+                            done[key] = max(done.get(key, 0), int(entry.get("seq", 0)))
+                        if entry.get("delivery"):
+                            seen.append((float(entry.get("at", 0)), entry["delivery"]))
+            except FileNotFoundError:
+                continue
+            for key, entry in enqueued.items():
+                at = float(entry.get("at", 0))
+                # Why: seqs are per file; across files the newest accepted event for a key wins
+                if entry["seq"] > done.get(key, 0) and at >= jobs.get(key, (at,))[0]:
+                    jobs[key] = (at, entry["event"])
+        for at, delivery in sorted(seen, key=lambda s: s[0]):
+            self._remember(delivery, at)
+        now = time.time()
+        for key, (at, event) in jobs.items():
+            self._seq += 1
+            self._pending[key] = _Job(key, event, self._seq, now, now + self.debounce)
+        self.stats["replayed"] = len(self._pending)
+        self._spill = None
+        self._compact()
+
+    def _compact(self) -> None:
+        """Rewrite the spill file as the queued and running events plus remembered deliveries."""
+        tmp = self.spill_path.with_name(self.spill_path.name + ".tmp")
+        # Why: a job still running at a crash has no "done" yet, so it is replayed
+        jobs = list(self._running.values()) + list(self._pending.values())
+        with open(tmp, "w", encoding="utf-8") as f:
+            for job in jobs:
+                f.write(json.dumps({"op": "enq", "seq": job.seq, "key": list(job.key), "event": job.event,
+                                    "at": job.first}, ensure_ascii=False) + "\n")
+            for delivery, at in self._deliveries.items():
+                f.write(json.dumps({"op": "seen", "delivery": delivery, "at": at}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.spill_path)
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = open(self.spill_path, "a", encoding="utf-8")
+        self._spill_lines = len(jobs) + len(self._deliveries)
+        self._compact_at = max(self.compact_every, 2 * self._spill_lines)
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Why: the services are top-level modules, not a package; CI runs plain `pytest`
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
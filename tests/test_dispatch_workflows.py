@@ -0,0 +1,112 @@
+import json, os, sys, threading, time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+requests = pytest.importorskip("requests")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+import dispatch_workflows as dw
+
+class StubAPI(ThreadingHTTPServer):
+    """Answers each POST with the next scripted (status, headers), then 204s; logs what it got."""
+    daemon_threads = True
+
+    def __init__(self, script):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.script = list(script)
+        self.seen = []
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        self.server.seen.append((time.monotonic(), self.path, self.headers.get("Authorization"), body))
+        status, headers = self.server.script.pop(0) if self.server.script else (204, {})
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def stub(request):
+    server = StubAPI(getattr(request, "param", []))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def response(**headers) -> requests.Response:
+    r = requests.Response()
+    r.headers.update({k.replace("_", "-"): v for k, v in headers.items()})
+    return r
+
+def test_retry_after_seconds_and_http_date():
+    assert dw.retry_after(response(Retry_After="7"), 60) == 7
+    assert dw.retry_after(response(Retry_After="900"), 60) == 60
+    wait = dw.retry_after(response(Retry_After=formatdate(time.time() + 30, usegmt=True)), 60)
+    assert 28 <= wait <= 30
+    assert dw.retry_after(response(Retry_After=formatdate(time.time() - 30, usegmt=True)), 60) == 0
+
+def test_retry_after_from_exhausted_rate_limit():
+    reset = str(int(time.time()) + 20)
+    assert 18 <= dw.retry_after(response(X_RateLimit_Remaining="0", X_RateLimit_Reset=reset), 60) <= 20
+    assert dw.retry_after(response(X_RateLimit_Remaining="0", X_RateLimit_Reset="soon"), 60) == 60
+    assert dw.retry_after(response(X_RateLimit_Remaining="12", X_RateLimit_Reset=reset), 60) is None
+    assert dw.retry_after(response(), 60) is None
+
+def test_success_posts_ref_inputs_and_token(stub):
+    result = dw.dispatch_one("acme", "site", "main", "ci.yml", "tok", {"env": "prod"}, api=stub.url)
+    assert result["ok"] and result["tries"] == 1 and result["status"] == 204
+    _, path, auth, body = stub.seen[0]
+    assert path == "/repos/acme/site/actions/workflows/ci.yml/dispatches"
+    assert auth == "Bearer tok"
+    assert body == {"ref": "main", "inputs": {"env": "prod"}}
+
+@pytest.mark.parametrize("stub", [[(429, {"Retry-After": "1"})]], indirect=True)
+def test_retry_after_is_honored_before_retrying(stub):
+    result = dw.dispatch_one("acme", "site", "main", "ci.yml", "tok", {}, delay=0.01, api=stub.url)
+    assert result["ok"] and result["tries"] == 2
+    assert stub.seen[1][0] - stub.seen[0][0] >= 0.9
+
+@pytest.mark.parametrize("stub", [[(403, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "4102444800"})]],
+                         indirect=True)
+def test_exhausted_rate_limit_waits_capped_by_max_wait(stub):
+    result = dw.dispatch_one("acme", "site", "main", "ci.yml", "tok", {}, delay=0.01, api=stub.url, max_wait=0.3)
+    assert result["ok"] and result["tries"] == 2
+    assert 0.25 <= stub.seen[1][0] - stub.seen[0][0] < 2
+
+@pytest.mark.parametrize("stub", [[(403, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "4102444800"})]],
+                         indirect=True)
+def test_rate_limit_pauses_the_shared_gate(stub):
+    gate = dw.RateGate(4)
+    dw.dispatch_one("acme", "site", "main", "ci.yml", "tok", {}, tries=1, api=stub.url, gate=gate, max_wait=0.3)
+    started = time.monotonic()
+    gate.wait()  # Why: what every other worker does before its next request
+    assert time.monotonic() - started >= 0.2
+
+@pytest.mark.parametrize("stub", [[(404, {})]], indirect=True)
+def test_permanent_errors_are_not_retried(stub):
+    result = dw.dispatch_one("acme", "site", "main", "ci.yml", "tok", {}, delay=0.01, api=stub.url)
+    assert not result["ok"] and result["tries"] == 1 and result["status"] == 404
+
+@pytest.mark.parametrize("stub", [[(502, {})] * 3], indirect=True)
+def test_server_errors_retry_then_give_up(stub):
+    result = dw.dispatch_one("acme", "site", "main", "ci.yml", "tok", {}, tries=3, delay=0.01, api=stub.url)
+    assert not result["ok"] and result["tries"] == 3 and result["status"] == 502
+    assert len(stub.seen) == 3
+
+def test_dispatch_all_reports_every_row(stub):
+    rows = [{"owner": "acme", "repo": f"r{i}"} for i in range(10)]
+    results = dw.dispatch_all(rows, "tok", {}, concurrency=4, per_host=2, api=stub.url)
+    assert [r["repo"] for r in results] == [f"acme/r{i}" for i in range(10)]
+    assert all(r["ok"] for r in results)
+    assert len(stub.seen) == 10
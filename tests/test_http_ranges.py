@@ -0,0 +1,85 @@
+import os, re
+import pytest
+
+pytest.importorskip("werkzeug")
+from werkzeug.http import http_date
+from http_ranges import MAX_RANGES, byte_ranges, file_chunks, file_plan
+
+SIZE = 1000
+ETAG = "17f-3e8"
+MTIME = 1_700_000_000.0
+
+def ranges(header, if_range=""):
+    return byte_ranges(header, if_range, ETAG, MTIME, SIZE)
+
+def test_no_range_means_whole_file():
+    assert ranges("") is None
+
+def test_suffix_range_is_the_tail():
+    assert ranges("bytes=-100") == [(900, 1000)]
+    assert ranges("bytes=-5000") == [(0, 1000)]
+
+def test_open_and_clamped_ranges():
+    assert ranges("bytes=990-") == [(990, 1000)]
+    assert ranges("bytes=0-4999") == [(0, 1000)]
+
+def test_unsatisfiable_range_is_416():
+    assert ranges("bytes=1000-") == []
+    status, headers, pieces = file_plan(os.stat_result((0,) * 6 + (SIZE, 0, 0, 0)), "text/plain", [])
+    assert status == 416
+    assert headers["Content-Range"] == "bytes */1000"
+    assert pieces == []
+
+def test_unparseable_or_foreign_units_are_ignored():
+    assert ranges("bytes=abc") is None
+    assert ranges("items=0-1") is None
+
+def test_adjacent_ranges_merge():
+    assert ranges("bytes=0-99,100-149,500-599") == [(0, 150), (500, 600)]
+
+def test_overlapping_ranges_fall_back_to_whole_file():
+    assert ranges("bytes=500-599,0-99,50-149") is None
+
+def test_too_many_ranges_fall_back_to_whole_file():
+    spec = ",".join(f"{i * 10}-{i * 10}" for i in range(MAX_RANGES + 1))
+    assert ranges("bytes=" + spec) is None
+
+def test_if_range_etag():
+    assert ranges("bytes=0-9", f'"{ETAG}"') == [(0, 10)]
+    assert ranges("bytes=0-9", '"stale"') is None
+
+def test_if_range_date():
+    assert ranges("bytes=0-9", http_date(MTIME)) == [(0, 10)]
+    assert ranges("bytes=0-9", http_date(MTIME - 60)) is None
+
+def test_single_range_plan():
+    st = os.stat_result((0,) * 6 + (SIZE, 0, 0, 0))
+    status, headers, pieces = file_plan(st, "text/plain", [(10, 20)])
+    assert status == 206
+    assert headers["Content-Range"] == "bytes 10-19/1000"
+    assert headers["Content-Length"] == "10"
+    assert pieces == [(10, 20)]
+
+def test_multipart_body_matches_length_and_parts(tmp_path):
+    path = tmp_path / "blob.bin"
+    data = bytes(range(256)) * 4
+    path.write_bytes(data)
+    st = os.stat(path)
+    status, headers, pieces = file_plan(st, "application/octet-stream", [(0, 10), (500, 520)])
+    assert status == 206
+    boundary = re.fullmatch(r"multipart/byteranges; boundary=(\w+)", headers["Content-Type"]).group(1)
+    body = b"".join(file_chunks(open(path, "rb"), pieces))
+    assert len(body) == int(headers["Content-Length"])
+    parts = body.split(f"--{boundary}".encode())
+    assert parts[-1] == b"--\r\n"
+    assert b"Content-Range: bytes 0-9/1024\r\n\r\n" + data[0:10] in parts[1]
+    assert b"Content-Range: bytes 500-519/1024\r\n\r\n" + data[500:520] in parts[2]
+
+def test_file_chunks_stops_when_file_shrinks(tmp_path):
+    path = tmp_path / "shrink.bin"
+    path.write_bytes(b"x" * 100)
+    f = open(path, "rb")
+    chunks = file_chunks(f, [(0, 100)])
+    os.truncate(path, 40)
+    assert b"".join(chunks) == b"x" * 40
+    assert f.closed
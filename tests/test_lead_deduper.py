@@ -0,0 +1,66 @@
+import json, time
+from datetime import datetime, timezone
+import pytest
+
+from lead_store import LeadDeduper, LeadStore
+
+def stamp(offset: float) -> str:
+    return datetime.fromtimestamp(time.time() + offset, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+def write_journal(path, records):
+    with open(path, "a", encoding="utf-8") as f:
+        for rec in records:
+            f.write(json.dumps(rec) + "\n")
+
+@pytest.fixture
+def store(tmp_path):
+    return LeadStore(tmp_path)
+
+def test_repeat_within_window_is_a_duplicate(store):
+    d = LeadDeduper(store, window=60)
+    assert d.claim("Ada@Example.com") is True
+    assert d.claim(" ada@example.com ") is False
+    assert d.stats == {"duplicates": 1, "accepted": 1}
+
+def test_repeat_after_window_is_accepted(store, monkeypatch):
+    d = LeadDeduper(store, window=60)
+    now = time.time()
+    assert d.claim("bo@example.com")
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert d.claim("bo@example.com")
+
+def test_zero_window_disables_the_check(store):
+    d = LeadDeduper(store, window=0)
+    assert d.claim("cy@example.com") and d.claim("cy@example.com")
+
+def test_journal_from_other_workers_counts(store, tmp_path):
+    write_journal(tmp_path / "leads.jsonl", [{"email": "di@example.com", "ts": stamp(-30)},
+                                            {"email": "ed@example.com", "ts": stamp(-3600)}])
+    d = LeadDeduper(store, window=600)
+    assert d.claim("di@example.com") is False
+    assert d.claim("ed@example.com") is True
+
+def test_future_timestamp_does_not_block_new_leads(store, tmp_path):
+    # Why: a client clock years ahead would otherwise hold the email for the whole window forever
+    write_journal(tmp_path / "leads.jsonl", [{"email": "fa@example.com", "ts": "2099-01-01T00:00:00Z"}])
+    assert LeadDeduper(store, window=600).claim("fa@example.com") is True
+
+def test_future_timestamp_does_not_hide_a_recent_one(store, tmp_path):
+    write_journal(tmp_path / "leads.jsonl", [{"email": "gu@example.com", "ts": stamp(-10)},
+                                            {"email": "gu@example.com", "ts": "2099-01-01T00:00:00Z"}])
+    assert LeadDeduper(store, window=600).claim("gu@example.com") is False
+
+def test_release_undoes_a_claim(store):
+    d = LeadDeduper(store, window=60)
+    assert d.claim("hu@example.com")
+    d.release("HU@example.com")
+    assert d.claim("hu@example.com")
+
+def test_recent_map_is_pruned_to_the_window(store, monkeypatch):
+    d = LeadDeduper(store, window=60)
+    now = time.time()
+    for i in range(1023):
+        d.claim(f"old{i}@example.com")
+    monkeypatch.setattr(time, "time", lambda: now + 120)
+    d.claim("new@example.com")
+    assert list(d._recent) == ["new@example.com"]
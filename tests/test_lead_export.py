@@ -0,0 +1,99 @@
+import csv, gzip, io, json, random
+import pytest
+
+import lead_export
+from lead_export import compact, export, iter_json_leads, iter_leads, sorted_lines
+from lead_store import LeadStore
+
+def write_journal(path, records):
+    with open(path, "a", encoding="utf-8") as f:
+        for rec in records:
+            f.write(json.dumps(rec) + "\n")
+
+def lead(i, **kw):
+    return {"id": f"j{i}", "ts": f"2026-01-01T00:{i // 60:02d}:{i % 60:02d}Z", "email": f"u{i}@example.com",
+            "plan": "pro" if i % 2 else "free", **kw}
+
+@pytest.fixture
+def data(tmp_path):
+    shuffled = [lead(i) for i in range(50)]
+    random.Random(7).shuffle(shuffled)
+    write_journal(tmp_path / "leads-20260101T000000000000Z.jsonl", shuffled[:20])
+    (tmp_path / "leads-20260102T000000000000Z.jsonl.gz").write_bytes(
+        gzip.compress("".join(json.dumps(r) + "\n" for r in shuffled[20:35]).encode()))
+    write_journal(tmp_path / "leads.jsonl", shuffled[35:])
+    return tmp_path
+
+def test_external_sort_spans_many_runs(tmp_path):
+    records = [lead(i) for i in range(500)]
+    random.Random(1).shuffle(records)
+    runs_dir = tmp_path / "runs"
+    runs_dir.mkdir()
+    lines = list(sorted_lines(records, {"duplicates": 0}, run_records=7, tmp_dir=runs_dir))
+    assert [json.loads(l)["id"] for l in lines] == [f"j{i}" for i in range(500)]
+    assert not list(runs_dir.iterdir())  # Why: spilled runs are cleaned up
+
+def test_copies_collapse_and_the_last_read_wins():
+    stats = {"duplicates": 0}
+    records = [lead(1), lead(2), lead(1, plan="team"), {"ts": "x", "n": 1}, {"ts": "x", "n": 1}]
+    out = [json.loads(l) for l in sorted_lines(records, stats, run_records=2)]
+    assert [r.get("id") for r in out] == ["j1", "j2", None]
+    assert out[0]["plan"] == "team"
+    assert stats["duplicates"] == 2
+
+def test_iter_leads_merges_every_segment_in_order(data):
+    assert [r["id"] for r in iter_leads(data, run_records=8)] == [f"j{i}" for i in range(50)]
+
+def test_leads_json_wins_over_the_journal_copy(data):
+    (data / "leads.json").write_text(json.dumps({"other": {"x": [1]}, "leads": [lead(3, plan="team")]}))
+    out = list(iter_leads(data, plan="team"))
+    assert [r["id"] for r in out] == ["j3"]
+
+def test_filters_and_csv_export(data):
+    body = b"".join(export(data, "csv", since="2026-01-01T00:00:10", until="2026-01-01T00:00:15", plan="pro"))
+    rows = list(csv.reader(io.StringIO(body.decode())))
+    assert rows[0] == list(lead_export.FIELDS)
+    assert [r[-1] for r in rows[1:]] == ["j11", "j13", "j15"]
+
+def test_columns_export_chunks_rows(data):
+    chunks = [json.loads(c) for c in export(data, "columns", chunk_rows=20)]
+    assert [c["rows"] for c in chunks] == [20, 20, 10]
+    assert chunks[0]["columns"]["id"][:2] == ["j0", "j1"]
+
+def test_json_document_is_streamed_item_by_item(tmp_path):
+    path = tmp_path / "leads.json"
+    path.write_text(json.dumps({"meta": {"leads": "no"}, "leads": [lead(i) for i in range(30)]}))
+    assert [r["id"] for r in iter_json_leads(path, chunk=16)] == [f"j{i}" for i in range(30)]
+    path.write_text('{"leads": [{"id": "a"}, {"id": ')
+    with pytest.raises(ValueError):
+        list(iter_json_leads(path, chunk=16))
+
+def test_compact_writes_one_sorted_segment(data):
+    (data / ".leads.idx").write_bytes(b"stale")
+    stats = compact(data, run_records=8)
+    assert stats["segments"] == 3 and stats["written"] == 50
+    out = data / stats["output"]
+    assert sorted(p.name for p in data.glob("leads*")) == sorted([out.name, "leads.jsonl"])
+    assert (data / "leads.jsonl").stat().st_size == 0
+    assert not (data / ".leads.idx").exists()
+    lines = gzip.decompress(out.read_bytes()).decode().splitlines()
+    assert [json.loads(l)["id"] for l in lines] == [f"j{i}" for i in range(50)]
+    assert [r["id"] for r in iter_leads(data)] == [f"j{i}" for i in range(50)]
+
+def test_compact_leaves_leads_json_alone_and_store_skips_its_copies(data):
+    doc = json.dumps({"leads": [lead(49, plan="team")]})
+    (data / "leads.json").write_text(doc)
+    stats = compact(data)
+    assert stats["duplicates"] == 1 and stats["written"] == 50
+    assert (data / "leads.json").read_text() == doc
+    store = LeadStore(data)
+    assert store.count() == 50
+    assert [r["plan"] for r in store.query(limit=1)["leads"]] == ["team"]
+
+def test_malformed_leads_json_aborts_compaction(data):
+    before = {p.name: p.stat().st_size for p in data.glob("leads*")}
+    (data / "leads.json").write_text('{"leads": [{"id": "a"},')
+    with pytest.raises(ValueError):
+        compact(data)
+    assert {p.name: p.stat().st_size for p in data.glob("leads*") if p.name != "leads.json"} == before
+    assert not list(data.glob("*.tmp"))
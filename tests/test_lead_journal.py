@@ -0,0 +1,80 @@
+import gzip, json, os
+
+from lead_journal import LeadJournal, _gzip_segment, iter_records, journal_segments
+
+def journal(tmp_path, **kw) -> LeadJournal:
+    return LeadJournal(tmp_path, flush_ms=0.1, fsync=False, **kw)
+
+def records(path):
+    return [rec for _, rec in iter_records(path)]
+
+def test_appends_are_on_disk_when_append_returns(tmp_path):
+    j = journal(tmp_path)
+    for i in range(5):
+        j.append({"id": i})
+    assert records(tmp_path / "leads.jsonl") == [{"id": i} for i in range(5)]
+    j.close()
+
+def test_torn_tail_is_truncated_on_open(tmp_path):
+    path = tmp_path / "leads.jsonl"
+    path.write_bytes(b'{"id": 1}\n{"id": 2}\n{"id": 3, "na')
+    j = journal(tmp_path)
+    assert path.read_bytes() == b'{"id": 1}\n{"id": 2}\n'
+    assert j.stats["recovered_bytes"] == len(b'{"id": 3, "na')
+    j.append({"id": 4})
+    assert records(path) == [{"id": 1}, {"id": 2}, {"id": 4}]
+    j.close()
+
+def test_torn_tail_without_any_newline_empties_the_file(tmp_path):
+    (tmp_path / "leads.jsonl").write_bytes(b'{"id": 1')
+    journal(tmp_path).close()
+    assert (tmp_path / "leads.jsonl").read_bytes() == b""
+
+def test_iter_records_stops_at_a_torn_tail(tmp_path):
+    path = tmp_path / "seg.jsonl"
+    path.write_bytes(b'{"id": 1}\nnot json\n{"id": 2}\n{"id": 3')
+    assert list(iter_records(path)) == [(0, {"id": 1}), (19, {"id": 2})]
+
+def test_rotation_past_max_bytes(tmp_path):
+    j = journal(tmp_path, max_bytes=30, compress=False)
+    for i in range(4):
+        j.append({"id": i, "pad": "x" * 10})
+    j.close()
+    segments = journal_segments(tmp_path)
+    assert segments[-1] == tmp_path / "leads.jsonl"
+    assert len(segments) == 4 and j.stats["rotations"] == 3
+    assert [rec["id"] for seg in segments for rec in records(seg)] == [0, 1, 2, 3]
+
+def test_rotated_segment_is_gzipped_and_plain_copy_removed(tmp_path):
+    j = journal(tmp_path, max_bytes=1, compress=False)
+    j.append({"id": 1})
+    j.append({"id": 2})
+    j.close()
+    plain = next(tmp_path.glob("leads-*.jsonl"))
+    _gzip_segment(plain)
+    assert not plain.exists()
+    assert gzip.decompress(plain.with_name(plain.name + ".gz").read_bytes()) == b'{"id": 1}\n'
+    assert not list(tmp_path.glob("*.tmp"))
+
+def test_gz_wins_over_plain_left_by_a_crash(tmp_path):
+    plain = tmp_path / "leads-20260101T000000000000Z.jsonl"
+    plain.write_bytes(b'{"id": 1}\n')
+    (tmp_path / (plain.name + ".gz")).write_bytes(gzip.compress(plain.read_bytes()))
+    assert journal_segments(tmp_path) == [tmp_path / (plain.name + ".gz")]
+
+def test_leftover_gzip_parts_are_removed_on_open(tmp_path):
+    part = tmp_path / "leads-20260101T000000000000Z.jsonl.gz.tmp"
+    part.write_bytes(b"\x1f\x8b half")
+    journal(tmp_path).close()
+    assert not part.exists()
+
+def test_second_writer_follows_a_rotation(tmp_path):
+    a = journal(tmp_path, max_bytes=1, compress=False)
+    b = journal(tmp_path, compress=False)
+    a.append({"id": 1})
+    a.append({"id": 2})  # rotates; b still holds the old fd
+    b.append({"id": 3})
+    a.close()
+    b.close()
+    assert records(tmp_path / "leads.jsonl") == [{"id": 2}, {"id": 3}]
+    assert os.path.getsize(next(tmp_path.glob("leads-*.jsonl"))) == len(json.dumps({"id": 1})) + 1
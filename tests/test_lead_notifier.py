@@ -0,0 +1,137 @@
+import socketserver, threading, time
+from email import message_from_bytes
+import pytest
+
+from lead_notifier import LeadNotifier
+
+class Relay(socketserver.ThreadingTCPServer):
+    """Just enough SMTP for smtplib: records messages, can refuse DATA or hang up after one."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), RelayHandler)
+        self.messages, self.sessions = [], 0
+        self.refuse_data = 0
+        self.hang_up_after_send = False
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+class RelayHandler(socketserver.StreamRequestHandler):
+    def reply(self, line: str) -> None:
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        relay = self.server
+        relay.sessions += 1
+        self.reply("220 relay ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            verb = line.split(b" ", 1)[0].strip().upper()
+            if verb in (b"EHLO", b"HELO"):
+                self.reply("250 relay")
+            elif verb in (b"MAIL", b"RCPT", b"RSET", b"NOOP"):
+                self.reply("250 ok")
+            elif verb == b"DATA":
+                if relay.refuse_data:
+                    relay.refuse_data -= 1
+                    self.reply("451 try again later")
+                    continue
+                self.reply("354 go ahead")
+                body = b""
+                while (chunk := self.rfile.readline()) not in (b".\r\n", b""):
+                    body += chunk
+                relay.messages.append(message_from_bytes(body))
+                self.reply("250 queued")
+                if relay.hang_up_after_send:
+                    return
+            elif verb == b"QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("502 not implemented")
+
+@pytest.fixture
+def relay():
+    server = Relay()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def notifier(relay, **kw) -> LeadNotifier:
+    return LeadNotifier("127.0.0.1", "owner@example.com", port=relay.server_address[1], starttls=False,
+                        backoff=0.01, timeout=5, **kw)
+
+def wait_for(cond, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_single_lead_is_sent(relay):
+    n = notifier(relay).start()
+    n.submit({"name": "Ada", "email": "ada@example.com", "plan": "pro"})
+    wait_for(lambda: n.stats["sent"] == 1)
+    n.stop()
+    assert relay.messages[0]["Subject"] == "New Lead: Ada (pro)"
+    assert "email: ada@example.com" in relay.messages[0].get_payload()
+
+def test_burst_becomes_one_digest(relay):
+    n = notifier(relay, digest_threshold=5)
+    for i in range(7):
+        n.submit({"name": f"lead{i}", "email": f"l{i}@example.com"})
+    n.start()
+    wait_for(lambda: n.stats["sent"] == 1)
+    n.stop()
+    assert n.stats["digests"] == 1
+    assert [m["Subject"] for m in relay.messages] == ["7 New Leads"]
+    assert relay.messages[0].get_payload().count("name: lead") == 7
+
+def test_transient_refusal_is_retried(relay):
+    relay.refuse_data = 2
+    n = notifier(relay).start()
+    n.submit({"name": "Bo", "email": "bo@example.com"})
+    wait_for(lambda: n.stats["sent"] == 1)
+    n.stop()
+    assert n.stats["retries"] == 2
+    assert n.stats["failed"] == 0
+    assert "451" in n.last_error
+    assert len(relay.messages) == 1
+
+def test_gives_up_after_max_retries(relay):
+    relay.refuse_data = 10
+    n = notifier(relay, max_retries=3).start()
+    n.submit({"name": "Cy", "email": "cy@example.com"})
+    wait_for(lambda: n.stats["failed"] == 1)
+    n.stop()
+    assert n.stats["retries"] == 2
+    assert n.stats["sent"] == 0
+    assert relay.messages == []
+
+def test_reconnects_after_relay_drops_the_session(relay):
+    relay.hang_up_after_send = True
+    n = notifier(relay).start()
+    n.submit({"name": "Di", "email": "di@example.com"})
+    wait_for(lambda: n.stats["sent"] == 1)
+    n.submit({"name": "Ed", "email": "ed@example.com"})
+    wait_for(lambda: n.stats["sent"] == 2)
+    n.stop()
+    assert n.stats["reconnects"] == 2
+    assert relay.sessions == 2
+    assert [m["Subject"] for m in relay.messages] == ["New Lead: Di (undecided)", "New Lead: Ed (undecided)"]
+
+def test_session_is_reused_while_it_stays_up(relay):
+    n = notifier(relay).start()
+    for sent, name in enumerate(("Fa", "Gu"), 1):
+        n.submit({"name": name, "email": f"{name}@example.com"})
+        wait_for(lambda: n.stats["sent"] == sent)
+    n.stop()
+    assert n.stats["reconnects"] == 1
+    assert relay.sessions == 1
+
+def test_full_queue_drops_and_counts():
+    n = LeadNotifier("127.0.0.1", "owner@example.com", maxsize=1)
+    assert n.submit({"name": "a"}) is True
+    assert n.submit({"name": "b"}) is False
+    assert n.stats["dropped"] == 1
@@ -0,0 +1,107 @@
+import gzip, json, pickle
+import pytest
+
+from lead_store import LeadStore, decode_cursor, encode_cursor
+
+def write_journal(path, records):
+    with open(path, "a", encoding="utf-8") as f:
+        for rec in records:
+            f.write(json.dumps(rec) + "\n")
+
+def lead(i, **kw):
+    return {"id": f"j{i}", "ts": f"2026-01-01T00:00:{i:02d}Z", "email": f"u{i % 3}@example.com",
+            "plan": "pro" if i % 2 else "free", **kw}
+
+@pytest.fixture
+def store(tmp_path):
+    write_journal(tmp_path / "leads.jsonl", [lead(i) for i in range(20)])
+    return LeadStore(tmp_path)
+
+def ids(page):
+    return [rec["id"] for rec in page["leads"]]
+
+def test_newest_first_pages_follow_the_cursor(store):
+    first = store.query(limit=8)
+    assert ids(first) == [f"j{i}" for i in range(19, 11, -1)]
+    second = store.query(limit=8, cursor=first["next_cursor"])
+    third = store.query(limit=8, cursor=second["next_cursor"])
+    assert ids(second) == [f"j{i}" for i in range(11, 3, -1)]
+    assert ids(third) == ["j3", "j2", "j1", "j0"]
+    assert third["next_cursor"] is None
+
+def test_filters_intersect_and_normalize(store):
+    assert ids(store.query({"plan": "PRO", "email": " U1@Example.com "})) == ["j19", "j13", "j7", "j1"]
+    assert ids(store.query({"plan": "enterprise"})) == []
+    assert ids(store.query({"nope": "x"}, limit=1)) == ["j19"]
+
+def test_time_window_is_inclusive(store):
+    page = store.query(since="2026-01-01T00:00:05Z", until="2026-01-01T00:00:07Z")
+    assert ids(page) == ["j7", "j6", "j5"]
+
+def test_cursor_round_trip():
+    key = ("2026-01-01T00:00:05Z", 0, 42)
+    assert decode_cursor(encode_cursor(key)) == key
+
+@pytest.mark.parametrize("cursor", ["", "%%%", "bm90IGpzb24", encode_cursor([1, 2, 3]), encode_cursor(["a", 1]),
+                                    "WyJhIiwgMWU5OTksIDBd", encode_cursor(["a", True, 0])])
+def test_malformed_cursor_is_a_value_error(store, cursor):
+    # Why: app.py turns ValueError from query() into a 400
+    with pytest.raises(ValueError):
+        store.query(cursor=cursor or "=")
+
+def test_appends_are_picked_up_incrementally(store, tmp_path):
+    assert store.count() == 20
+    write_journal(tmp_path / "leads.jsonl", [lead(30)])
+    with open(tmp_path / "leads.jsonl", "a") as f:
+        f.write('{"id": "torn"')
+    assert store.count() == 21
+    assert ids(store.query(limit=1)) == ["j30"]
+
+def test_rotated_and_gzipped_segments_still_read(store, tmp_path):
+    store.count()
+    active = tmp_path / "leads.jsonl"
+    rotated = tmp_path / "leads-20260101T000000000000Z.jsonl.gz"
+    rotated.write_bytes(gzip.compress(active.read_bytes()))
+    active.unlink()
+    write_journal(active, [lead(40)])
+    assert store.count() == 21
+    assert ids(store.query(limit=2)) == ["j40", "j19"]
+    assert ids(store.query({"email": "u0@example.com"}, limit=2)) == ["j18", "j15"]
+
+def test_restart_resumes_from_the_saved_index(store, tmp_path):
+    store.count()
+    store.save()
+    write_journal(tmp_path / "leads.jsonl", [lead(50)])
+    again = LeadStore(tmp_path)
+    assert again.journal.seq == 20  # Why: loaded, not re-parsed
+    assert again.count() == 21
+    assert ids(again.query(limit=2)) == ["j50", "j19"]
+
+def test_index_holds_locations_not_records(store, tmp_path):
+    store.count()
+    store.save()
+    with open(tmp_path / ".leads.idx", "rb") as f:
+        saved = pickle.load(f)["journal"]
+    assert saved.records == {}
+    assert sorted(saved.locs.values())[:2] == [(0, 0), (0, len(json.dumps(lead(0))) + 1)]
+
+def test_node_copy_shadows_the_journal_record(store, tmp_path):
+    (tmp_path / "leads.json").write_text(json.dumps({"leads": [
+        {"id": "j19", "ts": "2026-01-01T00:00:19Z", "email": "moved@example.com"},
+        {"id": "n1", "createdAt": "2026-02-01T00:00:00Z", "email": "n1@example.com"}]}))
+    assert store.count() == 21
+    page = store.query(limit=3)
+    assert ids(page) == ["n1", "j19", "j18"]
+    assert page["leads"][1]["email"] == "moved@example.com"
+    assert store.find_by_email("u1@example.com")[-1]["id"] == "j16"
+    assert store.last_seen("n1@example.com") == "2026-02-01T00:00:00Z"
+    assert store.last_seen("u0@example.com", until="2026-01-01T00:00:10Z") == "2026-01-01T00:00:09Z"
+
+def test_truncated_journal_rebuilds_from_what_is_left(store, tmp_path):
+    store.count()
+    rewritten = [lead(i, plan="team") for i in range(5, 8)]
+    with open(tmp_path / "leads.jsonl", "r+", encoding="utf-8") as f:
+        f.truncate(0)  # what lead_export.compact does to the active file
+        f.writelines(json.dumps(rec) + "\n" for rec in rewritten)
+    assert store.count() == 3
+    assert ids(store.query({"plan": "team"})) == ["j7", "j6", "j5"]
@@ -0,0 +1,134 @@
+import json, threading, time
+import pytest
+
+import sync_queue
+from sync_queue import SyncQueue
+
+class Recorder:
+    """Handler that logs every event it is given; ``fail`` raises for that many calls first."""
+
+    def __init__(self, fail=0):
+        self.events, self.fail = [], fail
+        self.lock = threading.Lock()
+
+    def __call__(self, event):
+        with self.lock:
+            if self.fail:
+                self.fail -= 1
+                raise RuntimeError("deploy hook down")
+            self.events.append(event)
+
+def wait_for(cond, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def push(sha, ref="refs/heads/main", repo="acme/site"):
+    return {"repo": repo, "ref": ref, "sha": sha}
+
+@pytest.fixture
+def spill(tmp_path):
+    return tmp_path / "gh-sync-queue.jsonl"
+
+def queue(handler, spill, **kw) -> SyncQueue:
+    kw.setdefault("debounce", 0.05)
+    return SyncQueue(handler, spill, backoff=0.01, **kw)
+
+def test_burst_to_one_branch_runs_once_for_the_newest_sha(spill):
+    seen = Recorder()
+    q = queue(seen, spill)
+    statuses = [q.submit(push(f"sha{i}")) for i in range(20)]
+    q.submit(push("other", ref="refs/heads/dev"))
+    wait_for(lambda: q.metrics()["processed"] == 2)
+    q.stop()
+    assert statuses[0] == "queued" and set(statuses[1:]) == {"coalesced"}
+    assert sorted(e["sha"] for e in seen.events) == ["other", "sha19"]
+    assert q.stats["coalesced"] == 19
+
+def test_max_delay_bounds_a_steady_stream(spill):
+    seen = Recorder()
+    q = queue(seen, spill, debounce=0.2, max_delay=0.3)
+    started = time.monotonic()
+    while not seen.events:
+        q.submit(push(str(time.monotonic())))
+        time.sleep(0.05)
+        assert time.monotonic() - started < 3
+    q.stop()
+    assert time.monotonic() - started < 1
+
+def test_repeat_delivery_and_full_queue(spill):
+    q = queue(Recorder(), spill, debounce=60, maxsize=1)
+    assert q.submit(push("a"), delivery="d1") == "queued"
+    assert q.submit(push("a"), delivery="d1") == "duplicate"
+    assert q.submit(push("b", ref="refs/heads/dev")) == "full"
+    q.stop()
+    assert q.submit(push("c")) == "closed"
+
+def test_failed_handler_is_retried(spill):
+    seen = Recorder(fail=2)
+    q = queue(seen, spill)
+    q.submit(push("a"))
+    wait_for(lambda: q.metrics()["processed"] == 1)
+    q.stop()
+    assert [e["sha"] for e in seen.events] == ["a"]
+
+def test_pending_events_are_replayed_after_restart(spill):
+    q = queue(Recorder(), spill, debounce=60)
+    q.submit(push("old"), delivery="d1")
+    q.submit(push("new"), delivery="d2")
+    q.submit(push("dev", ref="refs/heads/dev"))
+    q.stop()
+    seen = Recorder()
+    again = queue(seen, spill)
+    assert again.stats["replayed"] == 2
+    assert again.submit(push("new"), delivery="d2") == "duplicate"
+    wait_for(lambda: again.metrics()["processed"] == 2)
+    again.stop()
+    assert sorted(e["sha"] for e in seen.events) == ["dev", "new"]
+
+def test_completed_events_are_not_replayed(spill):
+    q = queue(Recorder(), spill)
+    q.submit(push("a"))
+    wait_for(lambda: q.metrics()["processed"] == 1)
+    q.stop()
+    again = queue(Recorder(), spill)
+    assert again.stats["replayed"] == 0
+    again.stop()
+
+def test_torn_spill_line_is_skipped(spill):
+    q = queue(Recorder(), spill, debounce=60)
+    q.submit(push("a"))
+    q.stop()
+    with open(spill, "a") as f:
+        f.write('{"op": "enq", "seq": 9, "key": ["acme/site", "refs/h')
+    again = queue(Recorder(), spill, debounce=60)
+    assert again.stats["replayed"] == 1
+    again.stop()
+
+@pytest.mark.skipif(sync_queue.fcntl is None, reason="slots are per-process only with flock")
+def test_second_worker_gets_its_own_slot_and_adopts_dead_ones(spill):
+    a, b, c = (queue(Recorder(), spill, debounce=60) for _ in range(3))
+    assert [q.spill_path.name for q in (a, b, c)] == [
+        "gh-sync-queue.jsonl", "gh-sync-queue.1.jsonl", "gh-sync-queue.2.jsonl"]
+    b.submit(push("from-b"))
+    c.submit(push("from-c", ref="refs/heads/dev"))
+    c.stop()  # c's worker is gone; its slot still holds the event
+    a.stop()
+    seen = Recorder()
+    d = queue(seen, spill)
+    assert d.spill_path == spill
+    wait_for(lambda: d.metrics()["processed"] == 1)
+    d.stop()
+    b.stop()
+    assert [e["sha"] for e in seen.events] == ["from-c"]  # b is alive, so its slot stays its own
+    assert not (spill.parent / "gh-sync-queue.2.jsonl").exists()
+
+def test_spill_file_is_compacted_as_it_grows(spill):
+    q = queue(Recorder(), spill, debounce=60, compact_every=50)
+    for i in range(200):
+        q.submit(push(str(i)), delivery=f"d{i}")
+    q.stop()
+    lines = [json.loads(l) for l in spill.read_text().splitlines()]
+    assert len(lines) < 250
+    assert [l["event"]["sha"] for l in lines if l["op"] == "enq"][-1] == "199"
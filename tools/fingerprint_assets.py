@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""Fingerprint static assets and rewrite HTML references.
+
+Usage: python tools/fingerprint_assets.py [--root .] [--dry-run]
+
+Copies every asset to ``<stem>.<hash>.<ext>`` next to the original, writes
+``asset-manifest.json`` (logical path -> fingerprinted path) and points the
+``src``/``href`` attributes in the HTML pages at the fingerprinted copies.
+app.py serves anything listed in the manifest as immutable.
+"""
+import argparse, hashlib, json, os, re, shutil, sys
+from pathlib import Path
+
+MANIFEST = "asset-manifest.json"
+ASSET_DIRS = ("assets", "css", "js")
+ROOT_BUNDLES = ("*.css", "app*.js", "sfs-*.js")
+ASSET_EXTS = {".css", ".js", ".mjs", ".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp", ".avif", ".ico", ".woff", ".woff2"}
+HTML_GLOBS = ("*.html", "blog/*.html", "projects/*.html", "pages/*.html")
+HASH_LEN = 10
+FINGERPRINT_RE = re.compile(r"\.[0-9a-f]{%d}(?=\.[^./]+$)" % HASH_LEN)
+REF_RE = re.compile(r"""(\b(?:src|href)\s*=\s*)(["'])([^"'#?]+)([^"']*)\2""", re.I)
+
+def file_hash(path):
+    h = hashlib.blake2b(digest_size=HASH_LEN // 2)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def fingerprinted_name(rel, digest):
+    stem, ext = os.path.splitext(rel)
+    return f"{stem}.{digest}{ext}"
+
+def logical_name(rel):
+    """Strip a fingerprint from ``rel`` if it has one."""
+    return FINGERPRINT_RE.sub("", rel, count=1)
+
+def collect_assets(root, previous):
+    stale = set(previous.values())
+    found = []
+    for d in ASSET_DIRS:
+        found += [p for p in sorted((root / d).rglob("*")) if p.is_file()]
+    for pattern in ROOT_BUNDLES:
+        found += sorted(p for p in root.glob(pattern) if p.is_file())
+    out = []
+    for p in found:
+        rel = p.relative_to(root).as_posix()
+        # Why: never fingerprint a fingerprinted copy from an earlier run
+        if p.suffix.lower() not in ASSET_EXTS or rel in stale or logical_name(rel) != rel:
+            continue
+        out.append(rel)
+    return sorted(set(out))
+
+def build_manifest(root, assets, dry_run=False):
+    manifest = {}
+    for rel in assets:
+        target = fingerprinted_name(rel, file_hash(root / rel))
+        manifest[rel] = target
+        if not dry_run and not (root / target).exists():
+            shutil.copy2(root / rel, root / target)
+    return manifest
+
+def remove_stale(root, previous, manifest, dry_run=False):
+    current = set(manifest.values())
+    removed = 0
+    for target in previous.values():
+        if target not in current and (root / target).is_file():
+            if not dry_run:
+                (root / target).unlink()
+            removed += 1
+    return removed
+
+def rewrite_html(root, html_path, manifest, dry_run=False):
+    html = html_path.read_text(encoding="utf-8")
+    page_dir = html_path.parent.relative_to(root).as_posix()
+
+    def swap(m):
+        prefix, quote, url, tail = m.groups()
+        if "//" in url or ":" in url:
+            return m.group(0)  # Why: external or data: URLs
+        absolute = url.startswith("/")
+        rel = os.path.normpath(url.lstrip("/") if absolute else os.path.join(page_dir, url)).replace(os.sep, "/")
+        target = manifest.get(logical_name(rel))
+        if target is None:
+            return m.group(0)
+        if absolute:
+            new_url = "/" + target
+        else:
+            new_url = os.path.relpath(target, page_dir or ".").replace(os.sep, "/")
+        return f"{prefix}{quote}{new_url}{tail}{quote}"
+
+    new = REF_RE.sub(swap, html)
+    if new == html:
+        return False
+    if not dry_run:
+        html_path.write_text(new, encoding="utf-8")
+    return True
+
+def main():
+    p = argparse.ArgumentParser(description="Fingerprint static assets and rewrite HTML references")
+    p.add_argument("--root", default=".")
+    p.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    args = p.parse_args()
+
+    root = Path(args.root).resolve()
+    manifest_path = root / MANIFEST
+    previous = {}
+    if manifest_path.exists():
+        try:
+            previous = json.loads(manifest_path.read_text(encoding="utf-8"))
+        except json.JSONDecodeError:
+            print("⚠️ Ignoring unreadable", MANIFEST)
+
+    assets = collect_assets(root, previous)
+    if not assets:
+        print("❌ No assets found under", root); sys.exit(1)
+    manifest = build_manifest(root, assets, args.dry_run)
+    removed = remove_stale(root, previous, manifest, args.dry_run)
+
+    pages = sorted({h for g in HTML_GLOBS for h in root.glob(g) if h.is_file()})
+    rewritten = [h for h in pages if rewrite_html(root, h, manifest, args.dry_run)]
+
+    if not args.dry_run:
+        manifest_path.write_text(json.dumps(manifest, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    print(f"✅ {len(manifest)} assets fingerprinted, {removed} stale copies removed, {len(rewritten)} pages rewritten")
+    for h in rewritten:
+        print("   ↳", h.relative_to(root).as_posix())
+
+if __name__ == "__main__":
+    main()
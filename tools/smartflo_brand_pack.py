@@ -1,5 +1,7 @@
-from PIL import Image, ImageOps, ImageDraw, ImageFont
-import os, sys, json
+from PIL import Image, ImageOps, ImageDraw, ImageFont, ImageChops, features
+import os, re, json, argparse, hashlib, fnmatch
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 BLACK = (11,11,11,255)
 GOLD = (230,184,92,255)
@@ -7,15 +9,26 @@ GOLD_DARK = (183,134,47,255)
 GOLD_LIGHT = (249,226,125,255)
 TEXT_LIGHT = (215,199,160,255)
 
+# Bump when rendering code changes in a way the cache key can't see
+BUILD_VERSION = 2
+CACHE_FILE = ".brandpack-cache.json"
+KEY_THRESHOLD = 25
+HERO_COPY = ("Booking • Ecom • AI Bots", "Plug-and-play automation for small businesses", "Get a demo → smartflosystems.com")
+FAVICON_SIZES = [512,192,64,48,32,16]
+FONT_NAMES = ("DejaVuSans-Bold.ttf","Arial Bold.ttf","Arial.ttf","DejaVuSans.ttf")
+
+def lanczos(im, size):
+    return im.resize(size, Image.Resampling.LANCZOS)
+
 def make_canvas(size, color=BLACK):
     return Image.new("RGBA", size, color)
 
-def center_paste(bg, fg, scale):
+def center_paste(bg, fg, scale, resize=lanczos):
     bw, bh = bg.size
     fw, fh = fg.size
     target_w = max(1, int(bw * scale))
     target_h = max(1, int(fh * (target_w / max(1, fw))))
-    fg_resized = fg.resize((target_w, target_h), Image.Resampling.LANCZOS)
+    fg_resized = resize(fg, (target_w, target_h))
     x = (bw - target_w) // 2
     y = (bh - target_h) // 2
     bg.alpha_composite(fg_resized, (x, y))
@@ -24,16 +37,23 @@ def center_paste(bg, fg, scale):
 def load_rgba(path):
     return Image.open(path).convert("RGBA")
 
-def make_transparent_black(im, threshold=25):
+def key_lut(threshold=25, feather=0):
+    """Coverage per brightest-channel value: 0 below threshold, ramping to 255 over `feather` levels."""
+    if feather <= 0:
+        return [0 if v < threshold else 255 for v in range(256)]
+    return [0 if v < threshold else min(255, (v - threshold + 1) * 255 // feather) for v in range(256)]
+
+def make_transparent_black(im, threshold=25, feather=0):
+    # Why: band math runs in C; a pixel is keyed when its brightest channel is under threshold
     im = im.convert("RGBA")
-    datas = im.getdata()
-    new = []
-    for r,g,b,a in datas:
-        if r<threshold and g<threshold and b<threshold:
-            new.append((0,0,0,0))
-        else:
-            new.append((r,g,b,a))
-    out = Image.new("RGBA", im.size); out.putdata(new); return out
+    r, g, b, _ = im.split()
+    peak = ImageChops.lighter(ImageChops.lighter(r, g), b)
+    keep = peak.point(key_lut(threshold, feather))
+    if feather <= 0:
+        return Image.composite(im, Image.new("RGBA", im.size, (0,0,0,0)), keep)
+    # Why: a graded mask through composite also darkens RGB, leaving black fringes; only fade alpha
+    im.putalpha(ImageChops.multiply(im.getchannel("A"), keep))
+    return im
 
 def crop_wave_icon(logo_rgba):
     bbox = logo_rgba.getbbox()
@@ -49,9 +69,9 @@ def crop_wave_icon(logo_rgba):
     sq.alpha_composite(wave, ((max_side-ww)//2,(max_side-wh)//2))
     return sq
 
-def export_rect(path, size, logo, scale):
+def export_rect(path, size, logo, scale, resize=lanczos):
     canvas = make_canvas(size)
-    out = center_paste(canvas, logo, scale)
+    out = center_paste(canvas, logo, scale, resize)
     out.save(path, "PNG", optimize=True)
 
 def export_square(path, s, logo, scale):
@@ -60,10 +80,17 @@ def export_square(path, s, logo, scale):
 def ensure_dirs(paths):
     for p in paths: os.makedirs(p, exist_ok=True)
 
+@lru_cache(maxsize=None)
+def truetype(name, size):
+    """Cached ImageFont by (name, size); None if the font isn't installed."""
+    try: return ImageFont.truetype(name, size)
+    except OSError: return None
+
+@lru_cache(maxsize=None)
 def load_font(size):
-    for name in ["DejaVuSans-Bold.ttf","Arial Bold.ttf","Arial.ttf","DejaVuSans.ttf"]:
-        try: return ImageFont.truetype(name, size)
-        except: continue
+    for name in FONT_NAMES:
+        font = truetype(name, size)
+        if font is not None: return font
     return ImageFont.load_default()
 
 def draw_centered_text(canvas, text, y, size, fill=GOLD, stroke=(0,0,0,255), stroke_w=1):
@@ -74,20 +101,20 @@ def draw_centered_text(canvas, text, y, size, fill=GOLD, stroke=(0,0,0,255), str
     draw.text((x,y), text, font=font, fill=fill, stroke_width=stroke_w, stroke_fill=stroke)
     return y+h
 
-def paste_logo_top(canvas, logo, max_width_ratio=0.28, top_pad_ratio=0.09):
+def paste_logo_top(canvas, logo, max_width_ratio=0.28, top_pad_ratio=0.09, resize=lanczos):
     cw,ch = canvas.size
     lw,lh = logo.size
     tw = int(cw * max_width_ratio)
     th = int(lh * (tw / lw))
-    lg = logo.resize((tw, th), Image.Resampling.LANCZOS)
+    lg = resize(logo, (tw, th))
     x = (cw - tw)//2
     y = int(ch * top_pad_ratio)
     canvas.alpha_composite(lg, (x,y))
     return (x, y+th)
 
-def build_og_hero(w,h,logo, headline, sub, cta):
+def build_og_hero(w,h,logo, headline, sub, cta, resize=lanczos):
     c = make_canvas((w,h))
-    _, below = paste_logo_top(c, logo, max_width_ratio=(0.28 if w>h else 0.36), top_pad_ratio=0.09)
+    _, below = paste_logo_top(c, logo, max_width_ratio=(0.28 if w>h else 0.36), top_pad_ratio=0.09, resize=resize)
     gap = int(h*0.04)
     y = below + gap
     y = draw_centered_text(c, headline, y, int(h*0.11), fill=GOLD, stroke=(0,0,0,255), stroke_w=1)
@@ -103,6 +130,41 @@ def build_og_hero(w,h,logo, headline, sub, cta):
     draw.text(((w-tw)//2, h-bar_h+(bar_h-th)//2), cta, font=font, fill=GOLD_LIGHT)
     return c
 
+class RenderContext:
+    """Keyed logo, wave icon and a memoized resize pyramid shared by every target in one process.
+
+    Each source image gets levels halved with LANCZOS on demand. ``resize``
+    starts from the smallest level still at least as large as the target, so
+    a 16px favicon resamples from a few dozen pixels rather than the full logo.
+    Images that aren't registered are resized directly. Fonts are cached
+    module-wide by ``truetype``/``load_font``.
+    """
+
+    def __init__(self, logo):
+        self.logo = logo
+        self._wave = None
+        self._levels = {id(logo): [logo]}
+
+    @property
+    def wave(self):
+        if self._wave is None:
+            self._wave = crop_wave_icon(self.logo)
+            self._levels[id(self._wave)] = [self._wave]
+        return self._wave
+
+    def resize(self, im, size):
+        levels = self._levels.get(id(im))
+        if levels is None:
+            return lanczos(im, size)
+        tw, th = size
+        while True:
+            lw, lh = levels[-1].size
+            if lw < 2*tw or lh < 2*th or min(lw, lh) < 2:
+                break
+            levels.append(lanczos(levels[-1], (lw//2, lh//2)))
+        base = next(l for l in levels if l.size[0] < 2*tw or l.size[1] < 2*th or l is levels[-1])
+        return base if base.size == size else lanczos(base, size)
+
 def write_webmanifest(use_static):
     prefix = "/static/icons/" if use_static else "/assets/icons/"
     data = {
@@ -123,6 +185,8 @@ def write_webmanifest(use_static):
 def inject_meta(html_path, use_static):
     with open(html_path,"r",encoding="utf-8") as f:
         html = f.read()
+    if "SmartFlo Systems meta & icons START" in html:
+        return False  # Why: re-runs must not stack a second copy of the block
     with open(html_path+".bak","w",encoding="utf-8") as f:
         f.write(html)
 
@@ -172,6 +236,7 @@ def inject_meta(html_path, use_static):
     new = html.replace("<head>", "<head>\n"+block, 1)
     with open(html_path,"w",encoding="utf-8") as f:
         f.write(new)
+    return True
 
 def write_browserconfig(use_static):
     path = "browserconfig.xml"
@@ -188,10 +253,263 @@ def write_browserconfig(use_static):
 """
     with open(path,"w",encoding="utf-8") as f: f.write(xml)
 
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path,"rb") as f:
+        for chunk in iter(lambda: f.read(1<<16), b""): h.update(chunk)
+    return h.hexdigest()
+
+def brand_targets(og_dir, icons_dir, logo_size):
+    """The export build graph: one node per output file, favicon-derived icons depend on their source."""
+    targets = []
+    def add(kind, path, deps=(), **params):
+        targets.append({"name": os.path.splitext(os.path.basename(path))[0], "kind": kind,
+                        "path": path, "deps": list(deps), "params": params})
+    og = lambda f: os.path.join(og_dir, f)
+    ic = lambda f: os.path.join(icons_dir, f)
+    # Masters
+    add("master", og("smartflo-logo-transparent.png"))
+    add("rect", og("smartflo-logo-on-black.png"), size=(max(1200,logo_size[0]), max(800,logo_size[1])), scale=1.0)
+    # Profiles & posts
+    add("rect", og("smartflo-post-1080x1080.png"), size=(1080,1080), scale=0.72)
+    add("rect", og("smartflo-post-portrait-1080x1350.png"), size=(1080,1350), scale=0.62)
+    add("rect", og("smartflo-post-landscape-1920x1080.png"), size=(1920,1080), scale=0.42)
+    add("rect", og("smartflo-story-1080x1920.png"), size=(1080,1920), scale=0.54)
+    # Covers
+    add("rect", og("smartflo-cover-x-1500x500.png"), size=(1500,500), scale=0.52)
+    add("rect", og("smartflo-cover-facebook-1640x924.png"), size=(1640,924), scale=0.45)
+    add("rect", og("smartflo-cover-linkedin-1584x396.png"), size=(1584,396), scale=0.55)
+    add("rect", og("smartflo-cover-universal-3000x1000.png"), size=(3000,1000), scale=0.50)
+    # OG base
+    add("rect", og("smartflo-og-1200x630.png"), size=(1200,630), scale=0.58)
+    add("rect", og("smartflo-og-1200x1200.png"), size=(1200,1200), scale=0.70)
+    # OG hero (with text)
+    add("hero", og("smartflo-og-hero-1200x630.png"), size=(1200,630), copy=HERO_COPY)
+    add("hero", og("smartflo-og-hero-1200x1200.png"), size=(1200,1200), copy=HERO_COPY)
+    # Favicons & PWA icons
+    for s in FAVICON_SIZES:
+        add("favicon", ic(f"favicon-{s}.png"), size=s)
+    add("resize", ic("apple-touch-icon-180.png"), deps=["favicon-192"], size=180)
+    add("copy", ic("android-chrome-512.png"), deps=["favicon-512"])
+    add("copy", ic("android-chrome-192.png"), deps=["favicon-192"])
+    return targets
+
+def select_targets(targets, patterns):
+    """Targets matching any --only pattern, plus whatever they depend on."""
+    if not patterns: return list(targets)
+    by_name = {t["name"]: t for t in targets}
+    keep = {t["name"] for t in targets if any(fnmatch.fnmatch(t["name"], p) for p in patterns)}
+    stack = list(keep)
+    while stack:
+        for d in by_name[stack.pop()]["deps"]:
+            if d not in keep: keep.add(d); stack.append(d)
+    return [t for t in targets if t["name"] in keep]
+
+def target_keys(targets, src_hash):
+    keys = {}
+    for t in targets:  # Why: declaration order already puts deps first
+        blob = {"v": BUILD_VERSION, "src": src_hash, "threshold": KEY_THRESHOLD, "kind": t["kind"],
+                "params": t["params"], "deps": [keys[d] for d in t["deps"]]}
+        keys[t["name"]] = hashlib.sha256(json.dumps(blob, sort_keys=True).encode()).hexdigest()
+    return keys
+
+# Per-process render state, set up once per pool worker by _init_worker
+_CTX = None
+
+def _init_worker(src, threshold):
+    global _CTX
+    _CTX = RenderContext(make_transparent_black(load_rgba(src), threshold=threshold))
+
+def render_target(t, paths):
+    ctx = _CTX
+    kind, p, path = t["kind"], t["params"], t["path"]
+    if kind == "master":
+        ctx.logo.save(path, "PNG", optimize=True)
+    elif kind == "rect":
+        export_rect(path, tuple(p["size"]), ctx.logo, p["scale"], ctx.resize)
+    elif kind == "hero":
+        w, h = p["size"]
+        build_og_hero(w, h, ctx.logo, *p["copy"], resize=ctx.resize).save(path, "PNG", optimize=True)
+    elif kind == "favicon":
+        s = p["size"]
+        canvas = make_canvas((s,s))
+        icon = ctx.resize(ctx.wave, (int(s*0.86), int(s*0.86)))
+        canvas.alpha_composite(icon, ((s-icon.size[0])//2, (s-icon.size[1])//2))
+        canvas.save(path, "PNG", optimize=True)
+    elif kind == "resize":
+        Image.open(paths[t["deps"][0]]).resize((p["size"],p["size"]), Image.Resampling.LANCZOS).save(path)
+    elif kind == "copy":
+        Image.open(paths[t["deps"][0]]).save(path)
+    return t["name"]
+
+def save_cache(cache_path, cache):
+    tmp = cache_path + ".tmp"
+    with open(tmp,"w",encoding="utf-8") as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    os.replace(tmp, cache_path)
+
+def build(targets, src, cache_path, jobs=None, force=False):
+    """Render stale targets, deps first, across a process pool; returns (built, skipped) names."""
+    src_hash = file_hash(src)
+    keys = target_keys(targets, src_hash)
+    try:
+        with open(cache_path,"r",encoding="utf-8") as f: cache = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        cache = {}
+    paths = {t["name"]: t["path"] for t in targets}
+    stale = {t["name"] for t in targets
+             if force or cache.get(t["path"]) != keys[t["name"]] or not os.path.exists(t["path"])}
+    built = []
+    pending = [t for t in targets if t["name"] in stale]
+    if pending:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(src, KEY_THRESHOLD)) as pool:
+            while pending:
+                # Why: a wave is every stale target whose stale deps are already rendered
+                wave = [t for t in pending if not any(d in stale and d not in built for d in t["deps"])]
+                failed = None
+                for fut in as_completed([pool.submit(render_target, t, paths) for t in wave]):
+                    try:
+                        name = fut.result()
+                    except Exception as e:
+                        failed = failed or e
+                        continue
+                    built.append(name)
+                    # Why: saved per target, so a later failure doesn't re-render everything that already succeeded
+                    cache[paths[name]] = keys[name]
+                    save_cache(cache_path, cache)
+                if failed is not None:
+                    raise failed
+                pending = [t for t in pending if t not in wave]
+    return built, [t["name"] for t in targets if t["name"] not in stale]
+
+# -- responsive image variants -------------------------------------------------
+
+# Bump when variant rendering changes in a way the cache key can't see
+VARIANT_VERSION = 1
+VARIANT_DIR = "variants"
+VARIANT_MANIFEST = "variants.json"
+VARIANT_WIDTHS = (320, 640, 960, 1280, 1920)
+VARIANT_SOURCES = (".png", ".jpg", ".jpeg")
+VARIANT_MIN_BYTES = 8 * 1024
+VARIANT_QUALITY = {"avif": 55, "webp": 80}
+FINGERPRINT_RE = re.compile(r"\.[0-9a-f]{10}\.[^./]+$")
+
+def variant_formats():
+    """Formats this Pillow build can encode, best first: AVIF (native or pillow-avif-plugin), then WebP."""
+    fmts = []
+    try:
+        avif = features.check("avif")
+    except Exception:  # Why: Pillow < 11.2 doesn't know the feature name
+        avif = False
+    if not avif:
+        try:
+            import pillow_avif  # noqa: F401  registers the AVIF plugin
+            avif = True
+        except ImportError:
+            pass
+    if avif: fmts.append("avif")
+    if features.check("webp"): fmts.append("webp")
+    return fmts
+
+def variant_sources(root):
+    """Raster images under ``root`` worth converting, as posix paths."""
+    out = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not (dirpath == root and d == VARIANT_DIR))
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            # Why: fingerprinted copies share their logical file's variants
+            if not name.lower().endswith(VARIANT_SOURCES) or FINGERPRINT_RE.search(name): continue
+            if os.path.getsize(path) < VARIANT_MIN_BYTES: continue
+            out.append(path.replace(os.sep, "/"))
+    return out
+
+def variant_key(fmts, widths):
+    blob = {"v": VARIANT_VERSION, "formats": fmts, "widths": list(widths), "quality": VARIANT_QUALITY}
+    return hashlib.sha256(json.dumps(blob, sort_keys=True).encode()).hexdigest()
+
+def render_variants(job):
+    """Encode every (width, format) of one source image; returns (src, size, variants)."""
+    src, out_stem, fmts, widths = job
+    with Image.open(src) as im:
+        im = ImageOps.exif_transpose(im)  # Why: browsers honor EXIF on the original, not on our copies
+        if im.mode not in ("RGB", "RGBA"):
+            im = im.convert("RGBA" if "A" in im.getbands() or "transparency" in im.info else "RGB")
+        w0, h0 = im.size
+        src_bytes = os.path.getsize(src)
+        variants = []
+        for w in sorted({w for w in widths if w < w0} | {w0}):
+            frame = im if w == w0 else lanczos(im, (w, max(1, round(h0 * w / w0))))
+            for fmt in fmts:
+                path = f"{out_stem}-{w}w.{fmt}"
+                if fmt == "avif":
+                    frame.save(path, "AVIF", quality=VARIANT_QUALITY[fmt], speed=6)
+                else:
+                    frame.save(path, "WEBP", quality=VARIANT_QUALITY[fmt], method=6)
+                size = os.path.getsize(path)
+                if size >= src_bytes:  # Why: never negotiate a client onto a bigger file
+                    os.remove(path)
+                    continue
+                variants.append({"path": path, "format": fmt, "width": w, "height": frame.size[1], "bytes": size})
+    return src, (w0, h0), variants
+
+def build_variants(root="assets", widths=VARIANT_WIDTHS, jobs=None, force=False):
+    """Render stale variants across a process pool and rewrite the manifest; returns (built, skipped) sources."""
+    fmts = variant_formats()
+    if not fmts:
+        raise RuntimeError("this Pillow build can encode neither WebP nor AVIF")
+    out_dir = os.path.join(root, VARIANT_DIR)
+    manifest_path = os.path.join(out_dir, VARIANT_MANIFEST)
+    try:
+        with open(manifest_path,"r",encoding="utf-8") as f: manifest = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        manifest = {}
+    key = variant_key(fmts, widths)
+    sources = variant_sources(root)
+    hashes = {src: file_hash(src) for src in sources}
+    stale = [src for src in sources
+             if force or (manifest.get(src) or {}).get("hash") != hashes[src] or manifest[src].get("key") != key
+             or not all(os.path.exists(v["path"]) for v in manifest[src].get("variants", ()))]
+    # Why: drop outputs of deleted sources so the manifest never points at a missing original
+    for src in [s for s in manifest if s not in hashes]:
+        for v in manifest.pop(src).get("variants", ()):
+            if os.path.exists(v["path"]): os.remove(v["path"])
+    jobs_in = []
+    for src in stale:
+        out_stem = os.path.join(out_dir, os.path.splitext(os.path.relpath(src, root))[0]).replace(os.sep, "/")
+        os.makedirs(os.path.dirname(out_stem), exist_ok=True)
+        jobs_in.append((src, out_stem, fmts, tuple(widths)))
+    if jobs_in:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            for src, (w, h), variants in pool.map(render_variants, jobs_in):
+                manifest[src] = {"hash": hashes[src], "key": key, "width": w, "height": h, "variants": variants}
+    os.makedirs(out_dir, exist_ok=True)
+    tmp = manifest_path + ".tmp"
+    with open(tmp,"w",encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, manifest_path)  # Why: app.py may be reading it live
+    return stale, [s for s in sources if s not in stale]
+
 def main():
-    if len(sys.argv)<2:
+    ap = argparse.ArgumentParser(description="Generate the SmartFlo brand pack (icons, OG images, posts, covers)")
+    ap.add_argument("logo", nargs="?", help="source logo, e.g. assets/brand/SmartFlo-Logo.png")
+    ap.add_argument("--only", nargs="*", default=[], help="target name patterns, e.g. 'smartflo-og-hero-*' 'favicon-*'")
+    ap.add_argument("--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    ap.add_argument("--force", action="store_true", help="ignore the build cache")
+    ap.add_argument("--list", action="store_true", help="print target names and exit")
+    ap.add_argument("--variants", nargs="?", const="assets", metavar="DIR",
+                    help="instead: write WebP/AVIF width variants of the images under DIR (default: assets)")
+    ap.add_argument("--widths", default=",".join(map(str, VARIANT_WIDTHS)), help="variant widths, comma-separated")
+    args = ap.parse_args()
+    if args.variants:
+        widths = sorted({int(w) for w in args.widths.split(",") if w.strip()})
+        built, skipped = build_variants(args.variants, widths, jobs=args.jobs, force=args.force)
+        print(f"✅ {len(built)} images rendered, {len(skipped)} unchanged (cached) — formats: {', '.join(variant_formats())}")
+        print("✅ Manifest:", os.path.join(args.variants, VARIANT_DIR, VARIANT_MANIFEST))
+        return
+    if not args.logo:
         print("Usage: python tools/smartflo_brand_pack.py assets/brand/SmartFlo-Logo.png"); return
-    src = sys.argv[1]
+    src = args.logo
     if not os.path.exists(src):
         print("❌ Logo not found at", src); return
 
@@ -203,45 +521,18 @@ def main():
     else:
         icons_dir = "assets/icons"; og_dir = "assets/og"
 
-    ensure_dirs([icons_dir, og_dir, "assets/brand", "tools"])
-
-    # Load & clean
-    logo = load_rgba(src)
-    logo_t = make_transparent_black(logo, threshold=25)
+    with Image.open(src) as im: logo_size = im.size
+    targets = brand_targets(og_dir, icons_dir, logo_size)
+    if args.list:
+        for t in targets: print(t["name"])
+        return
+    targets = select_targets(targets, args.only)
+    if not targets:
+        print("❌ No targets match --only", " ".join(args.only)); return
 
-    # Masters
-    logo_t.save(os.path.join(og_dir, "smartflo-logo-transparent.png"), "PNG", optimize=True)
-    export_rect(os.path.join(og_dir, "smartflo-logo-on-black.png"), (max(1200,logo_t.size[0]), max(800,logo_t.size[1])), logo_t, 1.0)
-
-    # Profiles & posts
-    export_square(os.path.join(og_dir, "smartflo-post-1080x1080.png"), 1080, logo_t, 0.72)
-    export_rect(os.path.join(og_dir, "smartflo-post-portrait-1080x1350.png"), (1080,1350), logo_t, 0.62)
-    export_rect(os.path.join(og_dir, "smartflo-post-landscape-1920x1080.png"), (1920,1080), logo_t, 0.42)
-    export_rect(os.path.join(og_dir, "smartflo-story-1080x1920.png"), (1080,1920), logo_t, 0.54)
-    # Covers
-    export_rect(os.path.join(og_dir, "smartflo-cover-x-1500x500.png"), (1500,500), logo_t, 0.52)
-    export_rect(os.path.join(og_dir, "smartflo-cover-facebook-1640x924.png"), (1640,924), logo_t, 0.45)
-    export_rect(os.path.join(og_dir, "smartflo-cover-linkedin-1584x396.png"), (1584,396), logo_t, 0.55)
-    export_rect(os.path.join(og_dir, "smartflo-cover-universal-3000x1000.png"), (3000,1000), logo_t, 0.50)
-    # OG base
-    export_rect(os.path.join(og_dir, "smartflo-og-1200x630.png"), (1200,630), logo_t, 0.58)
-    export_rect(os.path.join(og_dir, "smartflo-og-1200x1200.png"), (1200,1200), logo_t, 0.70)
-    # OG hero (with text)
-    hero1 = build_og_hero(1200,630, logo_t, "Booking • Ecom • AI Bots", "Plug-and-play automation for small businesses", "Get a demo → smartflosystems.com")
-    hero1.save(os.path.join(og_dir, "smartflo-og-hero-1200x630.png"), "PNG", optimize=True)
-    hero2 = build_og_hero(1200,1200, logo_t, "Booking • Ecom • AI Bots", "Plug-and-play automation for small businesses", "Get a demo → smartflosystems.com")
-    hero2.save(os.path.join(og_dir, "smartflo-og-hero-1200x1200.png"), "PNG", optimize=True)
-
-    # Favicons & PWA icons
-    wave = crop_wave_icon(logo_t)
-    for s in [512,192,64,48,32,16]:
-        canvas = make_canvas((s,s))
-        icon = wave.resize((int(s*0.86), int(s*0.86)), Image.Resampling.LANCZOS)
-        canvas.alpha_composite(icon, ((s-icon.size[0])//2, (s-icon.size[1])//2))
-        canvas.save(os.path.join(icons_dir, f"favicon-{s}.png"), "PNG", optimize=True)
-    Image.open(os.path.join(icons_dir, "favicon-192.png")).resize((180,180), Image.Resampling.LANCZOS).save(os.path.join(icons_dir, "apple-touch-icon-180.png"))
-    Image.open(os.path.join(icons_dir, "favicon-512.png")).save(os.path.join(icons_dir, "android-chrome-512.png"))
-    Image.open(os.path.join(icons_dir, "favicon-192.png")).save(os.path.join(icons_dir, "android-chrome-192.png"))
+    ensure_dirs([icons_dir, og_dir, "assets/brand", "tools"])
+    built, skipped = build(targets, src, os.path.join(og_dir, CACHE_FILE), jobs=args.jobs, force=args.force)
+    print(f"✅ {len(built)} rendered, {len(skipped)} unchanged (cached)")
 
     # Manifest + browserconfig
     write_webmanifest(use_static)
@@ -250,9 +541,11 @@ def main():
     # Inject meta into HTML/Jinja
     candidates = ["index.html","public/index.html","templates/base.html","templates/index.html"]
     target = next((p for p in candidates if os.path.exists(p)), None)
-    if target: 
-        inject_meta(target, use_static)
-        print("✅ Meta injected into:", target)
+    if target:
+        if inject_meta(target, use_static):
+            print("✅ Meta injected into:", target)
+        else:
+            print("✅ Meta already present in:", target)
     else:
         print("⚠️ Could not find an HTML/Jinja file to inject. Skipped injection.")
 